@@ -2,17 +2,19 @@ import os
 import sys
 import shutil
 import glob
+import time
 from pathlib import Path
 from aqt import mw
 from aqt.qt import *
 from aqt.qt import *
-from aqt.gui_hooks import editor_did_init_buttons, profile_will_close
+from aqt.gui_hooks import editor_did_init_buttons, profile_will_close, profile_did_open
 from aqt.editor import EditorMode, Editor
 from aqt.browser import Browser
 from aqt.addcards import AddCards
 from aqt.addons import AddonManager
 from anki.hooks import addHook
-from aqt.utils import showWarning
+from anki.utils import ids2str
+from aqt.utils import showWarning, askUserDialog, tooltip
 
 # --- Atomic Rename Strategy Implementation ---
 
@@ -96,10 +98,13 @@ print("🔍 sys.path includes:", sys.path[:3])
 
 
 from .settings_editor import SettingsWindow
-from .process_notes import process_notes
+from .process_notes import process_notes, process_single_note, resume_job
+from .job_journal import JobJournal, hash_prompt_config
 from .run_prompt_dialog import RunPromptDialog
 from .config_manager import ConfigManager
 from .backup_manager import BackupManager
+from .client_registry import ClientRegistry
+from .batch_jobs import BatchJobManager
 
 ADDON_NAME = 'IntelliFiller'
 
@@ -122,38 +127,19 @@ ConfigManager.migrate_legacy_config(__name__)
 
 def handle_edit_current_mode(editor: Editor, prompt_config):
     editCurrentWindow: EditCurrent = editor.parentWindow
-    common_fields = get_common_fields([editor.note.id])
+    # AddCards notes have no id yet, so read the fields from the note itself
+    common_fields = sorted(editor.note.keys())
     dialog = RunPromptDialog(editCurrentWindow, common_fields, prompt_config)
+    # Batch jobs only make sense for browser selections
+    dialog.batch_job_checkbox.setVisible(False)
+    dialog.only_changed_checkbox.setVisible(False)
     if dialog.exec() == QDialog.DialogCode.Accepted:
         result = dialog.get_result()
         updated_prompt_config = result["config"]
         if result["save"]:
             save_prompt_config(updated_prompt_config)
-        # Use process_notes even for single note in editor (it handles it safely now)
-        # We need to construct a browser-like object or pass the editor context?
-        # process_notes expects 'browser', but for single note editor mode we might need adaptation.
-        # Let's check process_notes signature.
-        # process_notes(browser, prompt_config, pipeline_name=None)
-        # It calls browser.selectedNotes() and uses browser.editor.
-        
-        # When in EditCurrent, we don't have the main browser object in the same state.
-        # However, process_notes is designed for Browser...
-        
-        # Wait, I refactored process_notes to rely on browser.selectedNotes().
-        # This breaks EditCurrent mode where there is no browser selection!
-        
-        # I need to FIX process_notes to handle non-browser contexts or add a helper for single note.
-        # Refactoring imports for now, but I might need to step back and add a helper in process_notes.
-        
-        # ACTUALLY: Let's re-add a wrapper or modify process_notes to accept list of notes directly?
-        # No, simpler: add a helper in __init__ or modify process_notes to be more flexible.
-        
-        # Let's look at how handle_edit_current_mode worked. It passed 'editor'.
-        # Previously: process_single_note(editor, updated_prompt_config)
-        
-        # My refactor of process_notes took 'browser'.
-        # If I want to support Edit Current, I must support passing an editor or note directly.
-        pass
+        # Single note straight from the editor, filled in the background (streamed if enabled)
+        process_single_note(editor, updated_prompt_config)
 
 def handle_add_cards_mode(editor: Editor, prompt_config):
     pass
@@ -161,30 +147,36 @@ def handle_add_cards_mode(editor: Editor, prompt_config):
 def save_prompt_config(updated_prompt_config):
     ConfigManager.save_prompt(updated_prompt_config)
 
+# notetype id -> (modification time, field names)
+_notetype_fields_cache = {}
+
+def get_notetype_fields(mid):
+    notetype = mw.col.models.get(mid)
+    if not notetype:
+        return set()
+    cached = _notetype_fields_cache.get(mid)
+    # Editing the notetype (e.g. renaming a field) bumps 'mod' and invalidates the entry
+    if cached and cached[0] == notetype['mod']:
+        return cached[1]
+    fields = frozenset(field['name'] for field in notetype['flds'])
+    _notetype_fields_cache[mid] = (notetype['mod'], fields)
+    return fields
+
 def get_common_fields(note_ids):
     if not note_ids:
         return []
-    
-    # helper to get fields for a note id
-    def get_fields(nid):
-        try:
-            note = mw.col.get_note(nid)
-            return set(note.keys())
-        except:
-            return set()
-            
-    # Start with fields of first note
-    if note_ids:
-        common_fields = get_fields(note_ids[0])
-    
-        # Intersect with rest
-        for nid in note_ids[1:]:
-            common_fields.intersection_update(get_fields(nid))
-            if not common_fields:
-                break
-                
-        return sorted(list(common_fields))
-    return []
+
+    # Fields only depend on the notetype, so a huge selection boils down to a few distinct ids
+    mids = mw.col.db.list(f"select distinct mid from notes where id in {ids2str(note_ids)}")
+
+    common_fields = None
+    for mid in mids:
+        fields = get_notetype_fields(mid)
+        common_fields = set(fields) if common_fields is None else common_fields & fields
+        if not common_fields:
+            break
+
+    return sorted(common_fields or [])
 
 def create_run_prompt_dialog_from_browser(browser, prompt_config):
     selected_nids = browser.selectedNotes()
@@ -203,7 +195,8 @@ def create_run_prompt_dialog_from_browser(browser, prompt_config):
         if result["save"]:
             save_prompt_config(updated_prompt_config)
             
-        process_notes(browser, updated_prompt_config)
+        process_notes(browser, updated_prompt_config, as_batch_job=result.get("batch", False),
+                      only_changed=result.get("onlyChanged", False))
 
 def handle_browser_mode(editor, prompt_config):
     browser = None
@@ -389,6 +382,55 @@ def check_security_cleanup():
 
 profile_will_close.append(check_security_cleanup)
 
+def close_pooled_clients():
+    """Releases keep-alive connections held by the provider client pool."""
+    ClientRegistry.clear()
+
+profile_will_close.append(close_pooled_clients)
+
+def offer_unfinished_jobs():
+    """Asks what to do with bulk jobs that were interrupted (crash or Anki closed mid-run)."""
+    for journal in JobJournal.list_unfinished(mw.pm.name):
+        total = len(journal.data["noteIds"])
+        done = journal.completed_count()
+        started = time.strftime("%Y-%m-%d %H:%M", time.localtime(journal.data.get("created", 0)))
+        text = f"IntelliFiller job '{journal.name}' (started {started}) stopped after {done} of {total} notes.\n\nResume it with the remaining notes?"
+
+        # The job always resumes with the prompt it started with; say so if it has been edited since
+        current = next((p for p in ConfigManager.list_prompts() if p.get("promptName") == journal.name), None)
+        if current is not None and hash_prompt_config({**current, "overwriteField": journal.prompt_config.get("overwriteField", False)}) != journal.data.get("configHash"):
+            text += "\n\nThe prompt has changed since then; the original version will be used."
+
+        choice = askUserDialog(text, ["Resume", "Discard", "Later"]).run()
+        if choice == "Resume":
+            resume_job(journal)
+        elif choice == "Discard":
+            journal.close()
+    update_resume_action()
+
+def update_resume_action():
+    count = len(JobJournal.list_unfinished(mw.pm.name))
+    action = getattr(mw, "intellifiller_resume_action", None)
+    if action is None:
+        action = QAction(mw)
+        action.triggered.connect(offer_unfinished_jobs)
+        mw.form.menuTools.addAction(action)
+        mw.intellifiller_resume_action = action
+    action.setText(f"{ADDON_NAME}: Resume Unfinished Jobs ({count})")
+    action.setVisible(count > 0)
+
+def on_profile_open_check_jobs():
+    update_resume_action()
+    if mw.intellifiller_resume_action.isVisible():
+        tooltip(f"{ADDON_NAME}: unfinished jobs found. Use Tools > {ADDON_NAME}: Resume Unfinished Jobs.", period=6000)
+
+# Crash-safe job journal: offer to resume interrupted runs once the collection is open
+profile_did_open.append(on_profile_open_check_jobs)
+
+# Offline batch jobs: resume polling for submitted jobs once a collection is open
+profile_did_open.append(lambda: BatchJobManager.instance().start())
+profile_will_close.append(lambda: BatchJobManager.instance().stop())
+
 # Setup Backup Timer
 def setup_backup_timer():
     settings = ConfigManager.load_settings()
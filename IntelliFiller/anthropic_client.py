@@ -1,13 +1,22 @@
 import json
 import httpx
 
+from .provider_errors import ProviderError, to_provider_error
+from .sse import iter_sse_data, raise_for_stream_status
+
 class SimpleAnthropicClient:
-    def __init__(self, api_key, model="claude-haiku-4-5"):
+    def __init__(self, api_key, model="claude-haiku-4-5", http_client=None, async_http_client=None):
         self.api_key = api_key
         self.model = model
         self.base_url = "https://api.anthropic.com/v1/messages"
-        
-    def create_message(self, prompt, max_tokens=2000, timeout=60.0):
+        # Optional pooled httpx.Client; falls back to one-off module-level requests
+        self.http_client = http_client
+        # Optional pooled httpx.AsyncClient for create_message_async
+        self.async_http_client = async_http_client
+        # Token usage of the last request (input, output and prompt cache reads/writes)
+        self.usage = None
+
+    def _build_request(self, prompt, max_tokens, cached_prefix=None):
         headers = {
             "x-api-key": self.api_key,
             "anthropic-version": "2023-06-01",
@@ -19,15 +28,95 @@ class SimpleAnthropicClient:
             "max_tokens": max_tokens,
             "messages": [{"role": "user", "content": prompt}]
         }
+        if cached_prefix:
+            # Static instructions go first as a cacheable system block; later requests read them from the prompt cache
+            data["system"] = [{"type": "text", "text": cached_prefix, "cache_control": {"type": "ephemeral"}}]
+        return headers, data
+        
+    def create_message(self, prompt, max_tokens=2000, timeout=60.0, cached_prefix=None):
+        headers, data = self._build_request(prompt, max_tokens, cached_prefix)
         
         try:
-            response = httpx.post(
+            response = (self.http_client or httpx).post(
                 self.base_url,
                 headers=headers,
                 json=data,
                 timeout=timeout
             )
             response.raise_for_status()
-            return response.json()['content'][0]['text']
+            body = response.json()
+            self.usage = body.get('usage')
+            return body['content'][0]['text']
+        except Exception as e:
+            error = to_provider_error("Anthropic", e)
+            if error is e:
+                # Unexpected response shape etc.; not worth retrying
+                error = ProviderError(f"Error calling Anthropic API: {str(e)}", retryable=False)
+            raise error from e
+
+    def stream_message(self, prompt, max_tokens=2000, timeout=60.0, cached_prefix=None):
+        """Yields the response text in pieces as the server streams it (server-sent events)."""
+        headers, data = self._build_request(prompt, max_tokens, cached_prefix)
+        data["stream"] = True
+
+        try:
+            with (self.http_client or httpx).stream(
+                "POST",
+                self.base_url,
+                headers=headers,
+                json=data,
+                timeout=timeout
+            ) as response:
+                raise_for_stream_status(response)
+                for event in iter_sse_data(response):
+                    event_type = event.get("type")
+                    if event_type == "message_start":
+                        self.usage = event.get("message", {}).get("usage")
+                    elif event_type == "content_block_delta":
+                        text = event.get("delta", {}).get("text")
+                        if text:
+                            yield text
+                    elif event_type == "error":
+                        # Errors after the 200 arrive in-band (e.g. overloaded_error)
+                        error = event.get("error", {})
+                        raise ProviderError(
+                            f"Error calling Anthropic API: {error.get('type')}: {error.get('message')}",
+                            retryable=error.get("type") in ("overloaded_error", "api_error", "rate_limit_error")
+                        )
+        except Exception as e:
+            error = to_provider_error("Anthropic", e)
+            if error is e:
+                if isinstance(e, ProviderError):
+                    raise
+                error = ProviderError(f"Error calling Anthropic API: {str(e)}", retryable=False)
+            raise error from e
+
+    async def create_message_async(self, prompt, max_tokens=2000, timeout=60.0, cached_prefix=None):
+        headers, data = self._build_request(prompt, max_tokens, cached_prefix)
+
+        try:
+            if self.async_http_client is not None:
+                response = await self.async_http_client.post(
+                    self.base_url,
+                    headers=headers,
+                    json=data,
+                    timeout=timeout
+                )
+            else:
+                async with httpx.AsyncClient() as client:
+                    response = await client.post(
+                        self.base_url,
+                        headers=headers,
+                        json=data,
+                        timeout=timeout
+                    )
+            response.raise_for_status()
+            body = response.json()
+            self.usage = body.get('usage')
+            return body['content'][0]['text']
         except Exception as e:
-            raise Exception(f"Error calling Anthropic API: {str(e)}")
\ No newline at end of file
+            error = to_provider_error("Anthropic", e)
+            if error is e:
+                # Unexpected response shape etc.; not worth retrying
+                error = ProviderError(f"Error calling Anthropic API: {str(e)}", retryable=False)
+            raise error from e
@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+
+class AsyncRunner:
+    """
+    Owns a single background asyncio event loop shared by all jobs.
+    Worker threads hand coroutines to it with submit() and get back a concurrent.futures.Future,
+    so hundreds of requests can be in flight without one OS thread per request.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name="IntelliFiller-asyncio", daemon=True)
+        self.thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedules a coroutine on the shared loop. Thread-safe."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def create_semaphore(self, value):
+        """Creates an asyncio.Semaphore bound to the shared loop (safe on Python 3.9)."""
+        async def make():
+            return asyncio.Semaphore(value)
+        return self.submit(make()).result()
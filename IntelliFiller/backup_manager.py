@@ -16,6 +16,9 @@ except ImportError:
     HAS_PYZIPPER = False
 
 class BackupManager:
+    # Sub-folders of user_files that are never backed up
+    EXCLUDED_DIRS = ['cache', 'jobs', 'batch_jobs']
+
     def __init__(self, config_manager, addon_dir):
         self.config_manager = config_manager
         self.addon_dir = addon_dir
@@ -69,6 +72,9 @@ class BackupManager:
             # Prune backup directory if it's inside user_files
             if abs_backup_path:
                  dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != abs_backup_path]
+            # Skip regenerable data (response cache etc.)
+            if root == self.user_files_dir:
+                 dirs[:] = [d for d in dirs if d not in self.EXCLUDED_DIRS]
 
             for file in files:
                 if file in excludes_names: continue
@@ -191,6 +197,9 @@ class BackupManager:
             # Prune backup directory if it's inside user_files
             if abs_backup_path:
                  dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != abs_backup_path]
+            # Skip regenerable data (response cache etc.)
+            if root == self.user_files_dir:
+                 dirs[:] = [d for d in dirs if d not in self.EXCLUDED_DIRS]
 
             for file in files:
                 if file in excludes_names: continue
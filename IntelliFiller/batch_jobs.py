@@ -0,0 +1,509 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+import httpx
+
+from .config_manager import ConfigManager
+from .client_registry import ClientRegistry
+from .data_request import create_prompt, check_prompt_size, resolve_model, get_response_cache, get_cache_key, is_cacheable
+from .provider_errors import ProviderError, to_provider_error
+from .write_buffer import NoteWriteBuffer
+from .collection_writer import CollectionWriter
+from .browser_refresh import BrowserRefresher, find_open_browser
+from .fill_state import FillStateRecorder
+
+# Providers with an offline batch endpoint
+BATCH_PROVIDERS = ('openai', 'anthropic')
+
+DEFAULT_BASE_URLS = {
+    'openai': "https://api.openai.com/v1",
+    'anthropic': "https://api.anthropic.com/v1",
+}
+
+
+def supports_batch_jobs(config):
+    return config.get('selectedApi', 'openai') in BATCH_PROVIDERS and config.get('emulate') != 'yes'
+
+
+def get_batch_base_url(config, provider):
+    # Overridable so jobs can be pointed at a proxy or a local stand-in server
+    key = f"{provider}BaseUrl"
+    return (config.get("batchJobs", {}).get(key) or DEFAULT_BASE_URLS[provider]).rstrip("/")
+
+
+class OpenAIBatchClient:
+    """OpenAI Batch API: upload a JSONL file of chat completion requests, poll, download the output file."""
+    label = "OpenAI Batch"
+
+    def __init__(self, base_url, api_key, http_client):
+        self.base_url = base_url
+        self.http_client = http_client
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+
+    @staticmethod
+    def build_line(custom_id, model, prompt):
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": model, "messages": [{"role": "user", "content": prompt}]}
+        }
+
+    def submit(self, jsonl_path, completion_window="24h"):
+        with open(jsonl_path, "rb") as f:
+            response = self.http_client.post(
+                f"{self.base_url}/files",
+                headers=self.headers,
+                data={"purpose": "batch"},
+                files={"file": (os.path.basename(jsonl_path), f, "application/jsonl")}
+            )
+        response.raise_for_status()
+        file_id = response.json()["id"]
+
+        response = self.http_client.post(
+            f"{self.base_url}/batches",
+            headers=self.headers,
+            json={"input_file_id": file_id, "endpoint": "/v1/chat/completions", "completion_window": completion_window}
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def get_status(self, batch_id):
+        """Returns ("running" | "ended" | "failed", batch object)."""
+        response = self.http_client.get(f"{self.base_url}/batches/{batch_id}", headers=self.headers)
+        response.raise_for_status()
+        batch = response.json()
+        status = batch.get("status")
+        if status in ("completed", "expired", "cancelled"):
+            # Expired/cancelled batches still return the requests that did finish
+            return "ended", batch
+        if status == "failed":
+            return "failed", batch
+        return "running", batch
+
+    def fetch_results(self, batch):
+        """Returns {custom_id: response text}; failed requests are left out."""
+        results = {}
+        file_id = batch.get("output_file_id")
+        if not file_id:
+            return results
+        response = self.http_client.get(f"{self.base_url}/files/{file_id}/content", headers=self.headers)
+        response.raise_for_status()
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            body = (item.get("response") or {}).get("body") or {}
+            try:
+                results[item["custom_id"]] = body["choices"][0]["message"]["content"].strip()
+            except (KeyError, IndexError, TypeError, AttributeError):
+                continue
+        return results
+
+
+class AnthropicBatchClient:
+    """Anthropic Message Batches API: submit the JSONL requests as one batch, poll, stream the results file."""
+    label = "Anthropic Batch"
+
+    def __init__(self, base_url, api_key, http_client):
+        self.base_url = base_url
+        self.http_client = http_client
+        self.headers = {
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
+
+    @staticmethod
+    def build_line(custom_id, model, prompt):
+        return {
+            "custom_id": custom_id,
+            "params": {
+                "model": model,
+                "max_tokens": 2000,
+                "messages": [{"role": "user", "content": prompt}]
+            }
+        }
+
+    def submit(self, jsonl_path, completion_window="24h"):
+        # The batch endpoint takes the requests inline; the JSONL file is the job's source of truth
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        response = self.http_client.post(
+            f"{self.base_url}/messages/batches",
+            headers=self.headers,
+            json={"requests": requests}
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def get_status(self, batch_id):
+        response = self.http_client.get(f"{self.base_url}/messages/batches/{batch_id}", headers=self.headers)
+        response.raise_for_status()
+        batch = response.json()
+        if batch.get("processing_status") == "ended":
+            return "ended", batch
+        return "running", batch
+
+    def fetch_results(self, batch):
+        results = {}
+        results_url = batch.get("results_url")
+        if not results_url:
+            return results
+        response = self.http_client.get(results_url, headers=self.headers)
+        response.raise_for_status()
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            result = item.get("result") or {}
+            if result.get("type") != "succeeded":
+                continue
+            try:
+                results[item["custom_id"]] = result["message"]["content"][0]["text"].strip()
+            except (KeyError, IndexError, TypeError):
+                continue
+        return results
+
+
+BATCH_CLIENTS = {
+    'openai': OpenAIBatchClient,
+    'anthropic': AnthropicBatchClient,
+}
+
+CREDENTIAL_KEYS = {
+    'openai': 'apiKey',
+    'anthropic': 'anthropicKey',
+}
+
+
+def get_batch_client(config, provider):
+    api_key = config.get(CREDENTIAL_KEYS[provider], "")
+    base_url = get_batch_base_url(config, provider)
+    # Uploads and result downloads can be large; don't hold them to the interactive timeout
+    timeout = max(float(config.get("netTimeout", 10.0)), 120.0)
+    http_client = ClientRegistry.get_http_client(f"batch:{provider}", base_url, api_key, timeout, config.get("http2", False))
+    return BATCH_CLIENTS[provider](base_url, api_key, http_client)
+
+
+class BatchJobStore:
+    """
+    Batch jobs persisted in user_files/batch_jobs/<profile> so they survive restarts and are only
+    applied to the collection they were created from. Each job is <id>.json (state + custom_id -> note id map) next to the submitted <id>.jsonl,
+    which is deleted once the results are applied.
+    """
+    @staticmethod
+    def directory(profile):
+        return os.path.join(ConfigManager.BATCH_JOBS_DIR, profile)
+
+    @classmethod
+    def path(cls, profile, job_id, ext="json"):
+        return os.path.join(cls.directory(profile), f"{job_id}.{ext}")
+
+    @classmethod
+    def save(cls, job):
+        os.makedirs(cls.directory(job["profile"]), exist_ok=True)
+        ConfigManager._write_file_safely(cls.path(job["profile"], job["id"]), json.dumps(job, indent=2))
+
+    @classmethod
+    def remove_requests(cls, job):
+        """Deletes the job's request file; it holds every rendered prompt and isn't needed once applied."""
+        try:
+            os.remove(cls.path(job["profile"], job["id"], "jsonl"))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[IntelliFiller] Could not remove batch request file: {e}")
+
+    @classmethod
+    def list_jobs(cls, profile, status=None):
+        jobs = []
+        directory = cls.directory(profile)
+        if not os.path.exists(directory):
+            return jobs
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                    job = json.load(f)
+            except Exception as e:
+                print(f"Error loading batch job {filename}: {e}")
+                continue
+            job["profile"] = profile
+            if status is None or job.get("status") == status:
+                jobs.append(job)
+        return jobs
+
+
+def create_batch_job(profile, notes, prompt_config, config):
+    """
+    Renders every prompt and writes the provider's JSONL batch file.
+    Returns the job record (not yet submitted), or None if no note produced a prompt.
+    """
+    provider = config.get('selectedApi', 'openai')
+    model = resolve_model(config, provider)
+    fmt = prompt_config.get("responseFormat", "text")
+    client_cls = BATCH_CLIENTS[provider]
+    cache = get_response_cache(config)
+
+    job_id = time.strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    # The inputs the prompts are rendered from, recorded as filled once the results are written
+    fill_state = FillStateRecorder(profile, [prompt_config])
+    items = {}
+    lines = []
+    for note in notes:
+        try:
+            prompt = create_prompt(note, prompt_config, config)
+            # The provider would only reject an oversized line after the whole batch ran
+            check_prompt_size(prompt, config)
+        except Exception as e:
+            sys.stderr.write(f"IntelliFiller Error: {str(e)}")
+            continue
+        custom_id = f"nid-{note.id}"
+        items[custom_id] = {
+            "nid": note.id,
+            # Lets finished results seed the response cache
+            "cacheKey": get_cache_key(config, prompt, fmt) if cache is not None else None,
+            "fill": list(fill_state.capture(note, 0)),
+        }
+        lines.append(json.dumps(client_cls.build_line(custom_id, model, prompt), ensure_ascii=False))
+
+    if not lines:
+        return None
+
+    os.makedirs(BatchJobStore.directory(profile), exist_ok=True)
+    with open(BatchJobStore.path(profile, job_id, "jsonl"), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+    return {
+        "id": job_id,
+        "profile": profile,
+        "provider": provider,
+        "model": model,
+        "batchId": None,
+        "status": "created",
+        "created": time.time(),
+        "promptConfig": prompt_config,
+        "items": items,
+    }
+
+
+def submit_batch_job(job, config):
+    """Uploads the job's JSONL file and records the provider batch id. Runs off the main thread."""
+    client = get_batch_client(config, job["provider"])
+    try:
+        job["batchId"] = client.submit(
+            BatchJobStore.path(job["profile"], job["id"], "jsonl"),
+            config.get("batchJobs", {}).get("completionWindow", "24h")
+        )
+    except Exception as e:
+        raise batch_error(client, e) from e
+    job["status"] = "submitted"
+    job["submitted"] = time.time()
+    BatchJobStore.save(job)
+    return job
+
+
+def poll_batch_job(job, config):
+    """
+    Checks a submitted job. Returns None while it is still running,
+    otherwise {custom_id: response text} for the requests that succeeded.
+    """
+    client = get_batch_client(config, job["provider"])
+    try:
+        state, batch = client.get_status(job["batchId"])
+        if state == "running":
+            return None
+        if state == "failed":
+            raise ProviderError(f"Batch job {job['batchId']} failed: {batch.get('errors')}", retryable=False)
+        return client.fetch_results(batch)
+    except Exception as e:
+        raise batch_error(client, e) from e
+
+
+def batch_error(client, e):
+    error = to_provider_error(client.label, e)
+    if error is e and not isinstance(e, ProviderError):
+        error = ProviderError(f"Error calling {client.label} API: {str(e)}", retryable=isinstance(e, httpx.TransportError))
+    return error
+
+
+class BatchJobManager:
+    """
+    Polls submitted batch jobs in the background and applies finished results to the notes.
+    Network calls run via mw.taskman; notes are written on the main thread.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self.timer = None
+        self.polling = set() # job ids with a poll in progress
+
+    def start(self):
+        from aqt import mw
+        from aqt.qt import QTimer
+
+        if self.timer is None:
+            self.timer = QTimer(mw)
+            self.timer.timeout.connect(self.poll_all)
+        interval = float(ConfigManager.get_snapshot().get("batchJobs", {}).get("pollInterval", 60))
+        self.timer.start(int(max(5.0, interval) * 1000))
+        # Check right away for jobs that finished while Anki was closed
+        self.poll_all()
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+
+    def submit(self, note_ids, prompt_config, parent=None):
+        """Builds the JSONL file on the main thread and uploads it in the background."""
+        from aqt import mw
+        from aqt.utils import showWarning, tooltip
+
+        notes = []
+        for nid in note_ids:
+            try:
+                notes.append(mw.col.get_note(nid))
+            except Exception:
+                pass # Deleted meanwhile
+
+        config = ConfigManager.get_snapshot()
+        job = create_batch_job(mw.pm.name, notes, prompt_config, config)
+        if job is None:
+            showWarning("No prompts could be rendered for the selected notes.")
+            return
+        BatchJobStore.save(job)
+
+        def on_done(future):
+            try:
+                future.result()
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = str(e)
+                BatchJobStore.save(job)
+                showWarning(f"IntelliFiller: could not submit batch job.\n{str(e)}")
+                return
+            tooltip(f"IntelliFiller: batch job with {len(job['items'])} notes submitted. Results are applied when it finishes.", parent=parent)
+            self.start()
+
+        mw.taskman.run_in_background(lambda: submit_batch_job(job, config), on_done)
+
+    def poll_all(self):
+        from aqt import mw
+
+        if mw.col is None:
+            return
+        config = ConfigManager.get_snapshot()
+        for job in BatchJobStore.list_jobs(mw.pm.name, status="submitted"):
+            if job["id"] in self.polling:
+                continue
+            self.polling.add(job["id"])
+            mw.taskman.run_in_background(
+                lambda job=job: poll_batch_job(job, config),
+                lambda future, job=job: self.on_polled(job, future, config)
+            )
+
+    def on_polled(self, job, future, config):
+        self.polling.discard(job["id"])
+        try:
+            results = future.result()
+        except ProviderError as e:
+            if e.retryable:
+                # Network hiccup; try again on the next tick
+                return
+            job["status"] = "failed"
+            job["error"] = str(e)
+            BatchJobStore.save(job)
+            sys.stderr.write(f"IntelliFiller Error: {str(e)}")
+            return
+        except Exception as e:
+            print(f"[IntelliFiller] Batch poll failed: {e}")
+            return
+
+        if results is None:
+            return
+        self.apply_results(job, results, config)
+
+    def apply_results(self, job, results, config):
+        from aqt import mw
+        from aqt.utils import tooltip
+        # Late import: process_notes imports this module
+        from .process_notes import apply_response_to_note
+
+        if mw.col is None or mw.pm.name != job["profile"]:
+            # The profile was switched while the poll ran; its own profile picks the job up again
+            return
+
+        prompt_config = job["promptConfig"]
+        fmt = prompt_config.get("responseFormat", "text")
+        cache = get_response_cache(config)
+
+        applied = 0
+        errors = []
+        # Only the rows of filled notes are repainted, as after a normal bulk run
+        refresher = BrowserRefresher(mw, find_open_browser(), config.get("browserRefreshIntervalMs", 1000))
+        fill_state = FillStateRecorder(job["profile"], [prompt_config])
+
+        def on_written(nids):
+            try:
+                fill_state.commit(nids)
+            except Exception as e:
+                print(f"[IntelliFiller] Could not update fill state: {e}")
+            refresher.notes_changed(nids)
+
+        write_buffer = NoteWriteBuffer(config.get("batchProcessing", {}).get("writeChunkSize", 50), on_written=on_written)
+        for custom_id, item in job["items"].items():
+            response = results.get(custom_id)
+            if response is None:
+                continue
+            try:
+                note = mw.col.get_note(item["nid"])
+                original_fields = list(note.fields)
+                apply_response_to_note(note, prompt_config, response, is_editor=False, flush=False)
+                if item.get("fill"):
+                    fill_state.add(tuple(item["fill"]))
+                write_buffer.add(note, original_fields)
+                applied += 1
+            except Exception as e:
+                # Deleted note, missing field or unparseable JSON
+                errors.append(str(e))
+                continue
+            if cache is not None and item.get("cacheKey") and is_cacheable(response, fmt):
+                cache.put(item["cacheKey"], response)
+
+        write_buffer.flush()
+        # Already on the main thread: write now rather than on the next event loop turn
+        CollectionWriter.instance().drain()
+        job["applied"] = applied
+        job["finished"] = time.time()
+        if applied or not job["items"]:
+            job["status"] = "applied"
+            BatchJobStore.save(job)
+            BatchJobStore.remove_requests(job)
+        else:
+            # Nothing reached a note: keep the request file so the job's prompts aren't lost
+            job["status"] = "failed"
+            job["error"] = errors[0] if errors else "The batch returned no results."
+            BatchJobStore.save(job)
+
+        if errors:
+            sys.stderr.write(f"IntelliFiller Error: {errors[0]}")
+        refresher.flush()
+        # Rebuilding the whole main window is slow on big collections; only on request
+        if config.get("fullResetOnFinish", False):
+            mw.reset()
+        tooltip(f"IntelliFiller: batch job '{prompt_config.get('promptName', job['id'])}' filled {applied}/{len(job['items'])} notes.")
@@ -0,0 +1,57 @@
+from aqt.qt import QTimer
+
+
+def refresh_browser_rows(browser, nids):
+    """
+    Refreshes the browser after the given notes changed, without mw.reset().
+    The table model only refetches the rows currently on screen; search, sorting and selection stay as they are.
+    """
+    if browser is None:
+        return
+    try:
+        table = getattr(browser, "table", None)
+        if table is not None:
+            table.redraw_cells()
+        elif hasattr(browser, "model"):
+            # Pre-2.1.45 browser
+            browser.model.reset()
+
+        # The open editor holds its own copy of the note; reload it if it was filled
+        editor = browser.editor
+        if editor is not None and editor.note is not None and editor.note.id in nids:
+            editor.note.load()
+            editor.loadNoteKeepingFocus()
+    except RuntimeError:
+        pass # Browser window was closed
+
+
+def find_open_browser():
+    """The browser window if it is open, for refreshes not started from it (e.g. batch jobs)."""
+    try:
+        from aqt import dialogs
+        return dialogs._dialogs.get("Browser", [None, None])[1]
+    except Exception:
+        return None
+
+
+class BrowserRefresher:
+    """Collects changed note ids and refreshes the browser at most once per interval."""
+    def __init__(self, parent, browser, interval_ms=1000):
+        self.browser = browser
+        self.pending = set()
+        self.timer = QTimer(parent)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(max(0, int(interval_ms)))
+        self.timer.timeout.connect(self.flush)
+
+    def notes_changed(self, nids):
+        self.pending.update(nids)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        self.timer.stop()
+        if not self.pending:
+            return
+        nids, self.pending = self.pending, set()
+        refresh_browser_rows(self.browser, nids)
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+
+import httpx
+import openai
+
+# HTTP/2 is optional: httpx only supports it when the 'h2' package is vendored
+try:
+    import h2
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+
+class ClientRegistry:
+    """
+    Keeps one long-lived client per provider so bulk runs reuse TCP/TLS connections.
+    A provider's client is rebuilt only when its configuration (base URL, key, timeout, HTTP/2) changes.
+    Replaced clients may still have requests in flight on other threads, so they are only closed by clear().
+    """
+    _lock = threading.Lock()
+    _clients = {}  # provider -> (config_key, client)
+    _async_clients = {}  # provider -> (config_key, client, loop)
+    _retired = []  # Replaced clients, closed on clear()
+    _retired_async = []  # (client, loop)
+
+    # Keep enough idle connections around for the parallel request setting
+    LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=64, keepalive_expiry=60.0)
+
+    @classmethod
+    def _build_http_client(cls, timeout, http2):
+        return httpx.Client(
+            timeout=timeout,
+            limits=cls.LIMITS,
+            http2=bool(http2) and HAS_HTTP2
+        )
+
+    @classmethod
+    def _build_async_http_client(cls, timeout, http2):
+        return httpx.AsyncClient(
+            timeout=timeout,
+            limits=cls.LIMITS,
+            http2=bool(http2) and HAS_HTTP2
+        )
+
+    @classmethod
+    def _get(cls, provider, config_key, factory):
+        with cls._lock:
+            entry = cls._clients.get(provider)
+            if entry and entry[0] == config_key:
+                return entry[1]
+
+            client = factory()
+            cls._clients[provider] = (config_key, client)
+            # Settings changed: the previous client is left to finish what it is doing
+            if entry:
+                cls._retired.append(entry[1])
+        return client
+
+    @classmethod
+    def get_http_client(cls, provider, base_url, api_key, timeout, http2=False):
+        """Returns a shared httpx.Client for providers that use raw HTTP (Anthropic, Gemini)."""
+        config_key = (base_url, api_key, float(timeout), bool(http2))
+        return cls._get(provider, config_key, lambda: cls._build_http_client(timeout, http2))
+
+    @classmethod
+    def get_openai_client(cls, provider, base_url, api_key, timeout, http2=False):
+        """Returns a shared openai.OpenAI client (OpenAI, OpenRouter, custom endpoints)."""
+        config_key = (base_url, api_key, float(timeout), bool(http2))
+
+        def factory():
+            return openai.OpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                timeout=timeout,
+                # Retries are handled by RetryPolicy in the worker
+                max_retries=0,
+                http_client=cls._build_http_client(timeout, http2)
+            )
+
+        return cls._get(provider, config_key, factory)
+
+    @classmethod
+    def _get_async(cls, provider, config_key, factory):
+        # Async clients are bound to the event loop that first uses them
+        loop = asyncio.get_running_loop()
+        config_key = config_key + (id(loop),)
+        with cls._lock:
+            entry = cls._async_clients.get(provider)
+            if entry and entry[0] == config_key:
+                return entry[1]
+
+            client = factory()
+            cls._async_clients[provider] = (config_key, client, loop)
+            if entry:
+                cls._retired_async.append((entry[1], entry[2]))
+        return client
+
+    @classmethod
+    def get_async_http_client(cls, provider, base_url, api_key, timeout, http2=False):
+        """Async counterpart of get_http_client. Must be called from inside the event loop."""
+        config_key = (base_url, api_key, float(timeout), bool(http2))
+        return cls._get_async(provider, config_key, lambda: cls._build_async_http_client(timeout, http2))
+
+    @classmethod
+    def get_async_openai_client(cls, provider, base_url, api_key, timeout, http2=False):
+        """Async counterpart of get_openai_client. Must be called from inside the event loop."""
+        config_key = (base_url, api_key, float(timeout), bool(http2))
+
+        def factory():
+            return openai.AsyncOpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                timeout=timeout,
+                # Retries are handled by RetryPolicy in the worker
+                max_retries=0,
+                http_client=cls._build_async_http_client(timeout, http2)
+            )
+
+        return cls._get_async(provider, config_key, factory)
+
+    @classmethod
+    def _close_async(cls, client, loop):
+        try:
+            if loop.is_closed():
+                return
+            coro = client.close() if isinstance(client, openai.AsyncOpenAI) else client.aclose()
+            asyncio.run_coroutine_threadsafe(coro, loop)
+        except Exception:
+            pass
+
+    @classmethod
+    def _close(cls, client):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    @classmethod
+    def clear(cls):
+        """Closes all pooled clients (e.g. on profile close)."""
+        with cls._lock:
+            clients = [client for _, client in cls._clients.values()] + cls._retired
+            async_clients = [(client, loop) for _, client, loop in cls._async_clients.values()] + cls._retired_async
+            cls._clients = {}
+            cls._async_clients = {}
+            cls._retired = []
+            cls._retired_async = []
+        for client in clients:
+            cls._close(client)
+        for client, loop in async_clients:
+            cls._close_async(client, loop)
@@ -0,0 +1,147 @@
+import sys
+import threading
+
+from .write_buffer import merge_changes
+
+
+class CollectionWriter:
+    """
+    The single channel through which background threads change notes.
+    Workers post (nid, {field: (old, new)}) updates; the main thread drains the queue via
+    mw.taskman.run_on_main, merging updates per note and saving them in chunks with col.update_notes.
+    A field whose current value no longer matches the old one was edited meanwhile and is left as is.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, chunk_size=50):
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.drained = threading.Condition(self.lock)
+        self.pending = {}    # nid -> {field: (old value or None, new value)}, merged across posts
+        self.callbacks = []  # (nids, callback) run on the main thread once written
+        self.drain_callbacks = [] # callback() run on the main thread after the next drain
+        self.scheduled = False
+
+    def post(self, updates, on_written=None, chunk_size=None):
+        """Queues field updates; on_written(nids) is called on the main thread after they are saved."""
+        from aqt import mw
+
+        nids = []
+        with self.lock:
+            if chunk_size:
+                self.chunk_size = max(1, int(chunk_size))
+            for nid, fields in updates:
+                merge_changes(self.pending.setdefault(nid, {}), fields)
+                nids.append(nid)
+            if on_written is not None:
+                self.callbacks.append((nids, on_written))
+            schedule = not self.scheduled
+            self.scheduled = True
+        # Several posts before the main thread gets to it are coalesced into one drain
+        if schedule:
+            mw.taskman.run_on_main(self.drain)
+
+    def notify_when_written(self, callback):
+        """Calls callback() on the main thread once every update posted so far has been saved."""
+        from aqt import mw
+
+        with self.lock:
+            self.drain_callbacks.append(callback)
+            schedule = not self.scheduled
+            self.scheduled = True
+        if schedule:
+            mw.taskman.run_on_main(self.drain)
+
+    def backlog(self):
+        with self.lock:
+            return len(self.pending)
+
+    def wait_for_backlog(self, limit, timeout=0.1):
+        """Blocks up to timeout while more than limit notes are waiting. Returns True once below it."""
+        with self.lock:
+            if len(self.pending) > limit:
+                self.drained.wait(timeout)
+            return len(self.pending) <= limit
+
+    def report_kept_edits(self, kept):
+        from aqt.utils import tooltip
+
+        for nid, name in kept:
+            print(f"[IntelliFiller] Note {nid}: '{name}' was edited while its request ran; kept the edit.")
+        tooltip(f"IntelliFiller: kept {len(kept)} field(s) edited during the run; their results were not written.")
+
+    def drain(self):
+        """Main thread only."""
+        from aqt import mw
+
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            callbacks, self.callbacks = self.callbacks, []
+            drain_callbacks, self.drain_callbacks = self.drain_callbacks, []
+            self.scheduled = False
+
+        written = set()
+        kept = [] # (nid, field) edited since the note was read; not overwritten
+        if mw.col is None:
+            print(f"[IntelliFiller] Collection closed; dropped {len(pending)} pending note updates.")
+            pending = {}
+
+        items = list(pending.items())
+        for start in range(0, len(items), self.chunk_size):
+            notes = []
+            for nid, fields in items[start:start + self.chunk_size]:
+                try:
+                    note = mw.col.get_note(nid)
+                except Exception:
+                    continue # Deleted meanwhile
+                changed = False
+                for name, (old, value) in fields.items():
+                    if name not in note:
+                        continue
+                    if old is not None and note[name] != old and note[name] != value:
+                        kept.append((nid, name))
+                        continue
+                    note[name] = value
+                    changed = True
+                if changed:
+                    notes.append(note)
+            try:
+                if hasattr(mw.col, "update_notes"):
+                    mw.col.update_notes(notes)
+                else:
+                    # Older Anki versions without the bulk API
+                    for note in notes:
+                        note.flush()
+            except Exception as e:
+                sys.stderr.write(f"IntelliFiller Error: {str(e)}")
+                continue
+            written.update(note.id for note in notes)
+
+        with self.lock:
+            self.drained.notify_all()
+
+        if kept:
+            self.report_kept_edits(kept)
+
+        for nids, callback in callbacks:
+            done = [nid for nid in nids if nid in written]
+            if done:
+                try:
+                    callback(done)
+                except Exception as e:
+                    print(f"[IntelliFiller] Write callback failed: {e}")
+
+        for callback in drain_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[IntelliFiller] Write callback failed: {e}")
@@ -2,18 +2,43 @@ import os
 import json
 import shutil
 import base64
+import threading
+from types import MappingProxyType
 from aqt import mw
 
+
+def _freeze(value):
+    """Recursively converts dicts/lists into read-only MappingProxyType/tuple."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
 class ConfigManager:
     ADDON_DIR = os.path.dirname(__file__)
     USER_FILES_DIR = os.path.join(ADDON_DIR, "user_files")
     SETTINGS_FILE = os.path.join(USER_FILES_DIR, "settings.json")
     CREDENTIALS_FILE = os.path.join(USER_FILES_DIR, "credentials.json")
     PROMPTS_DIR = os.path.join(USER_FILES_DIR, "prompts")
+    # Regenerable data (response cache); excluded from backups
+    CACHE_DIR = os.path.join(USER_FILES_DIR, "cache")
+    # Offline provider batch jobs (JSONL request files + job state)
+    BATCH_JOBS_DIR = os.path.join(USER_FILES_DIR, "batch_jobs")
+    # Progress journals of running bulk jobs (resume after a crash); excluded from backups
+    JOBS_DIR = os.path.join(USER_FILES_DIR, "jobs")
+    # Fingerprints of the last successful fill per note and prompt ("only changed" runs)
+    FILL_STATE_DIR = os.path.join(USER_FILES_DIR, "fill_state")
     
     # Portable hardcoded key (Fallback if user doesn't provide custom salt)
     _DEFAULT_KEY = "IntelliFiller_Portable_Key_2025"
 
+    # Cached read-only view of settings + credentials (see get_snapshot)
+    _snapshot = None
+    _snapshot_stamp = None
+    _snapshot_lock = threading.Lock()
+
     @classmethod
     def _write_file_safely(cls, path, content_str):
         """Atomic write: Write to .tmp then rename."""
@@ -67,6 +92,7 @@ class ConfigManager:
         cls._ensure_directories()
         content = json.dumps(data, indent=2, sort_keys=True)
         cls._write_file_safely(cls.SETTINGS_FILE, content)
+        cls.invalidate_snapshot()
 
     @classmethod
     def load_credentials(cls, key=None):
@@ -114,6 +140,45 @@ class ConfigManager:
             final_content = json_text
             
         cls._write_file_safely(cls.CREDENTIALS_FILE, final_content)
+        cls.invalidate_snapshot()
+
+    @classmethod
+    def _files_stamp(cls):
+        stamp = []
+        for path in (cls.SETTINGS_FILE, cls.CREDENTIALS_FILE):
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    @classmethod
+    def get_snapshot(cls):
+        """
+        Returns an immutable merged view of settings and decrypted credentials.
+        The files are only re-read when their mtime/size changes or after a save, so
+        request code can call this per note without parsing JSON or running the cipher.
+        """
+        stamp = cls._files_stamp()
+        with cls._snapshot_lock:
+            if cls._snapshot is not None and cls._snapshot_stamp == stamp:
+                return cls._snapshot
+
+        settings = cls.load_settings()
+        credentials = cls.load_credentials(key=settings.get("encryptionKey", ""))
+        snapshot = _freeze({**settings, **credentials})
+
+        with cls._snapshot_lock:
+            cls._snapshot = snapshot
+            cls._snapshot_stamp = stamp
+        return snapshot
+
+    @classmethod
+    def invalidate_snapshot(cls):
+        with cls._snapshot_lock:
+            cls._snapshot = None
+            cls._snapshot_stamp = None
 
     @classmethod
     def list_prompts(cls):
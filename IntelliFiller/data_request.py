@@ -1,6 +1,9 @@
 import re
 import sys
 import os
+import json
+import time
+from contextlib import contextmanager
 
 from aqt import mw
 
@@ -27,126 +30,349 @@ sys.path.append(vendor_dir)
 
 from .config_manager import ConfigManager
 
-import openai
 from .anthropic_client import SimpleAnthropicClient
 from .gemini_client import GeminiClient
-from html import unescape
-
-
-def create_prompt(note, prompt_config):
-    prompt_template = prompt_config['prompt']
-    pattern = re.compile(r'\{\{\{(\w+)\}\}\}')
-    field_names = pattern.findall(prompt_template)
-    for field_name in field_names:
-        if field_name not in note:
-            raise ValueError(f"Field '{field_name}' not found in note.")
-        prompt_template = prompt_template.replace(f'{{{{{{{field_name}}}}}}}', note[field_name])
-    # unescape HTML entities and replace line breaks with spaces
-    prompt_template = unescape(prompt_template)
-    # remove HTML tags
-    prompt_template = re.sub('<.*?>', '', prompt_template)
-    return prompt_template
-
-
-def send_prompt_to_llm(prompt):
-    # Load settings first to get encryption key and API selector
-    settings = ConfigManager.load_settings()
-    encryption_key = settings.get("encryptionKey", "")
-    
-    # Load credentials using the key
-    credentials = ConfigManager.load_credentials(key=encryption_key)
-    
-    # Merge for easier access
-    config = {**settings, **credentials}
-    
-    # Get timeout from settings (default 10s)
-    net_timeout = float(config.get("netTimeout", 10.0))
+from .client_registry import ClientRegistry
+from .response_cache import ResponseCache
+from .token_estimator import get_estimator, get_input_budget
+from .prompt_cache import get_prompt_parts, get_openai_cache_options, PromptCacheStats
+from .execution_manager import ExecutionManager
+from .provider_errors import to_provider_error
+from .prompt_template import get_template
 
-    if config.get('emulate') == 'yes':
-        print("Fake request: ", prompt)
-        return f"This is a fake response for emulation mode for the prompt {prompt}."
 
+def create_prompt(note, prompt_config, config=None):
+    if config is None:
+        config = load_request_config()
+    budget = get_input_budget(prompt_config, get_estimator(config))
+    return get_template(prompt_config).render(note, budget)
+
+
+# Model used when the per-provider model setting is left empty
+DEFAULT_MODELS = {
+    'openai': ('openaiModel', 'gpt-4o-mini'),
+    'anthropic': ('anthropicModel', 'claude-haiku-4-5'),
+    'gemini': ('geminiModel', 'gemini-2.0-flash-lite-001'),
+    'openrouter': ('openrouterModel', 'google/gemini-2.0-flash-lite-001'),
+    'custom': ('customModel', 'my-model'),
+}
+
+
+def parse_llm_json(response_text):
+    """
+    Parses JSON from LLM response, handling markdown code blocks.
+    Returns dict or None if parsing fails.
+    """
+    if not response_text:
+        return None
+        
+    # Remove markdown code blocks
+    # Pattern to match ```json ... ``` or just ``` ... ```
+    pattern = r"```(?:json)?\s*(.*?)\s*```"
+    match = re.search(pattern, response_text, re.DOTALL)
+    if match:
+        json_str = match.group(1)
+    else:
+        json_str = response_text
+        
     try:
-        print("Request to API: ", prompt)
-        def try_openai_call():
-            client = openai.OpenAI(
-                api_key=config['apiKey'],  # This is the default and can be omitted
-                timeout=net_timeout
-            )
-            response = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model=config.get('openaiModel') or 'gpt-4o-mini',
-            )
-            print("Response from OpenAI:", response)
-            return response.choices[0].message.content.strip()
-            
-        def try_anthropic_call():
-            client = SimpleAnthropicClient(
-                api_key=config['anthropicKey'], 
-                model=config.get('anthropicModel') or 'claude-haiku-4-5'
-            )
-            response = client.create_message(prompt, timeout=net_timeout)
-            print("Response from Anthropic:", response)
-            return response.strip()
-
-        def try_gemini_call():
-            client = GeminiClient(
-                api_key=config['geminiKey'],
-                model=config.get('geminiModel') or 'gemini-2.0-flash-lite-001'
-            )
-            response = client.generate_content(prompt, timeout=net_timeout)
-            print("Response from Gemini:", response)
-            return response.strip()
-
-        def try_openrouter_call():
-            client = openai.OpenAI(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=config['openrouterKey'],
-                timeout=net_timeout
-            )
-            response = client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=config.get('openrouterModel') or 'google/gemini-2.0-flash-lite-001',
-                extra_headers={
-                    "HTTP-Referer": "https://ankiweb.net/",
-                    "X-Title": "IntelliFiller Anki Addon",
-                }
-            )
-            print("Response from OpenRouter:", response)
-            return response.choices[0].message.content.strip()
-
-        def try_custom_call():
-            client = openai.OpenAI(
-                base_url=config['customUrl'],
-                api_key=config['customKey'],
-                timeout=net_timeout
-            )
-            response = client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=config.get('customModel') or 'my-model',
-            )
-            print("Response from Custom Provider:", response)
-            return response.choices[0].message.content.strip()
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        # Fallback: try to find start/end braces if there's extra text
+        start = json_str.find('{')
+        end = json_str.rfind('}')
+        if start != -1 and end != -1:
+             try:
+                 return json.loads(json_str[start:end+1])
+             except:
+                 pass
+        return None
+
+# Human-readable provider names for error messages
+PROVIDER_LABELS = {
+    'openai': 'OpenAI',
+    'anthropic': 'Anthropic',
+    'gemini': 'Gemini',
+    'openrouter': 'OpenRouter',
+    'custom': 'Custom Provider',
+}
+
+
+def load_request_config():
+    """Merged settings + credentials; cached by ConfigManager until the files change."""
+    return ConfigManager.get_snapshot()
+
+
+def resolve_model(config, provider=None):
+    provider = provider or config.get('selectedApi', 'openai')
+    key, default = DEFAULT_MODELS.get(provider, DEFAULT_MODELS['openai'])
+    return config.get(key) or default
+
+
+def get_response_cache(config):
+    """Returns the shared ResponseCache, or None if caching is disabled (always off in emulation mode)."""
+    cache_cfg = config.get("responseCache", {})
+    if not cache_cfg.get("enabled", True) or config.get('emulate') == 'yes':
+        return None
+    cache = ResponseCache.instance(ConfigManager.CACHE_DIR)
+    cache.configure(
+        cache_cfg.get("ttlDays", 30),
+        cache_cfg.get("maxEntries", 50000),
+        cache_cfg.get("maxSizeMB", 100)
+    )
+    return cache
+
+
+def get_cache_key(config, prompt, response_format):
+    provider = config.get('selectedApi', 'openai')
+    if provider == 'custom':
+        # Different endpoints may serve different models under the same name
+        provider = f"custom:{config.get('customUrl', '')}"
+    return ResponseCache.make_key(provider, resolve_model(config), response_format, prompt)
+
+
+def get_rate_limiter(config):
+    """Returns the shared RateLimiter for the selected provider, or None if it has no budget configured."""
+    if config.get('emulate') == 'yes':
+        return None
+    provider = config.get('selectedApi', 'openai')
+    limits = config.get("rateLimits", {}).get(provider, {})
+    limiter = ExecutionManager.instance().get_rate_limiter(provider, limits.get("rpm", 0), limits.get("tpm", 0))
+    return limiter if limiter.enabled else None
+
+
+def check_prompt_size(prompt, config):
+    """Rejects prompts larger than the model's context window locally. Returns the token estimate."""
+    if config.get('emulate') == 'yes':
+        return get_estimator(config).estimate(prompt)
+    return get_estimator(config).check(prompt, resolve_model(config))
+
+
+def request_llm_throttled(prompt, config):
+    tokens = check_prompt_size(prompt, config)
+    # Only real provider calls spend the budget; cache hits never get here
+    limiter = get_rate_limiter(config)
+    if limiter is not None:
+        limiter.acquire(tokens)
+    return request_llm(prompt, config)
+
+
+async def request_llm_throttled_async(prompt, config):
+    tokens = check_prompt_size(prompt, config)
+    limiter = get_rate_limiter(config)
+    if limiter is not None:
+        await limiter.acquire_async(tokens)
+    return await request_llm_async(prompt, config)
+
+
+def is_cacheable(response, response_format):
+    # Don't pin unparseable JSON answers in the cache; a retry may do better
+    return response_format != "json" or parse_llm_json(response) is not None
+
+
+def send_prompt_to_llm(prompt, response_format="text", config=None):
+    # Jobs pass the snapshot they resolved up front so the per-note path does no file I/O
+    if config is None:
+        config = load_request_config()
+    cache = get_response_cache(config)
+    if cache is None:
+        return request_llm_throttled(prompt, config)
+
+    key = get_cache_key(config, prompt, response_format)
+    return cache.fetch(key, lambda: request_llm_throttled(prompt, config), lambda r: is_cacheable(r, response_format))
 
+
+async def send_prompt_to_llm_async(prompt, response_format="text", config=None):
+    """
+    Async counterpart of send_prompt_to_llm, built on httpx.AsyncClient and openai.AsyncOpenAI.
+    Must be awaited on the AsyncRunner loop, where many calls can be in flight at once.
+    """
+    if config is None:
+        config = load_request_config()
+    cache = get_response_cache(config)
+    if cache is None:
+        return await request_llm_throttled_async(prompt, config)
+
+    key = get_cache_key(config, prompt, response_format)
+    return await cache.fetch_async(key, lambda: request_llm_throttled_async(prompt, config), lambda r: is_cacheable(r, response_format))
+
+
+OPENROUTER_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_HEADERS = {
+    "HTTP-Referer": "https://ankiweb.net/",
+    "X-Title": "IntelliFiller Anki Addon",
+}
+
+
+class ProviderRequest:
+    """
+    One prompt prepared for the selected provider. Client settings, model, prompt-cache options and
+    headers are resolved once here; send, send_async and stream only differ in how the call is made.
+    Errors are raised as typed provider errors so the caller can decide whether to retry.
+    """
+    def __init__(self, prompt, config):
+        self.prompt = prompt
+        self.provider = config.get('selectedApi', 'openai')
+        if self.provider not in PROVIDER_LABELS:
+            self.provider = 'openai'
+        self.label = PROVIDER_LABELS[self.provider]
+        self.model = resolve_model(config, self.provider)
+        # Get timeout from settings (default 10s)
+        self.net_timeout = float(config.get("netTimeout", 10.0))
+        self.max_tokens = int(config.get("maxOutputTokens", 2000))
+        self.http2 = config.get("http2", False)
+        self.base_url = None
+
+        if self.provider == 'anthropic':
+            self.api_key = config['anthropicKey']
+            self.prefix, self.suffix = get_prompt_parts(prompt, config)
+        elif self.provider == 'gemini':
+            self.api_key = config['geminiKey']
+        else:
+            # OpenAI-compatible chat completions
+            options = {}
+            if self.provider == 'openai':
+                self.api_key = config['apiKey']
+                options = get_openai_cache_options(prompt, config)
+            elif self.provider == 'openrouter':
+                self.base_url, self.api_key = OPENROUTER_URL, config['openrouterKey']
+                options = {"extra_headers": OPENROUTER_HEADERS}
+            else:
+                self.base_url, self.api_key = config['customUrl'], config['customKey']
+            self.options = {"messages": [{"role": "user", "content": prompt}], "model": self.model, **options}
+
+    @contextmanager
+    def provider_errors(self):
         try:
-            if config['selectedApi'] == 'anthropic':
-                return try_anthropic_call()
-            elif config['selectedApi'] == 'gemini':
-                return try_gemini_call()
-            elif config['selectedApi'] == 'openrouter':
-                return try_openrouter_call()
-            elif config['selectedApi'] == 'custom':
-                return try_custom_call()
-            else:  # openai
-                return try_openai_call()
+            yield
         except Exception as e:
-            # Re-raise exceptions so they can be caught by the worker thread
-            raise e
-    except Exception as e:
-        # Re-raise to be handled by the caller (worker thread)
-        raise e
\ No newline at end of file
+            error = to_provider_error(self.label, e)
+            if error is e:
+                raise
+            raise error from e
+
+    def http_client(self):
+        return ClientRegistry.get_http_client(self.provider, None, self.api_key, self.net_timeout, self.http2)
+
+    def async_http_client(self):
+        return ClientRegistry.get_async_http_client(self.provider, None, self.api_key, self.net_timeout, self.http2)
+
+    def openai_client(self):
+        return ClientRegistry.get_openai_client(self.provider, self.base_url, self.api_key, self.net_timeout, self.http2)
+
+    def async_openai_client(self):
+        return ClientRegistry.get_async_openai_client(self.provider, self.base_url, self.api_key, self.net_timeout, self.http2)
+
+    def completion_text(self, response):
+        PromptCacheStats.record_openai(response)
+        return response.choices[0].message.content
+
+    def finish(self, response):
+        print(f"Response from {self.label}:", response)
+        return response.strip()
+
+    def send(self):
+        print("Request to API: ", self.prompt)
+        with self.provider_errors():
+            if self.provider == 'anthropic':
+                client = SimpleAnthropicClient(api_key=self.api_key, model=self.model, http_client=self.http_client())
+                response = client.create_message(self.suffix, max_tokens=self.max_tokens, timeout=self.net_timeout, cached_prefix=self.prefix)
+                PromptCacheStats.record_anthropic(client.usage)
+            elif self.provider == 'gemini':
+                client = GeminiClient(api_key=self.api_key, model=self.model, http_client=self.http_client())
+                response = client.generate_content(self.prompt, timeout=self.net_timeout)
+            else:
+                response = self.completion_text(self.openai_client().chat.completions.create(**self.options))
+        return self.finish(response)
+
+    async def send_async(self):
+        print("Request to API: ", self.prompt)
+        with self.provider_errors():
+            if self.provider == 'anthropic':
+                client = SimpleAnthropicClient(api_key=self.api_key, model=self.model, async_http_client=self.async_http_client())
+                response = await client.create_message_async(self.suffix, max_tokens=self.max_tokens, timeout=self.net_timeout, cached_prefix=self.prefix)
+                PromptCacheStats.record_anthropic(client.usage)
+            elif self.provider == 'gemini':
+                client = GeminiClient(api_key=self.api_key, model=self.model, async_http_client=self.async_http_client())
+                response = await client.generate_content_async(self.prompt, timeout=self.net_timeout)
+            else:
+                response = self.completion_text(await self.async_openai_client().chat.completions.create(**self.options))
+        return self.finish(response)
+
+    def stream(self):
+        print("Streaming request to API: ", self.prompt)
+        with self.provider_errors():
+            if self.provider == 'anthropic':
+                client = SimpleAnthropicClient(api_key=self.api_key, model=self.model, http_client=self.http_client())
+                yield from client.stream_message(self.suffix, max_tokens=self.max_tokens, timeout=self.net_timeout, cached_prefix=self.prefix)
+                PromptCacheStats.record_anthropic(client.usage)
+            elif self.provider == 'gemini':
+                client = GeminiClient(api_key=self.api_key, model=self.model, http_client=self.http_client())
+                yield from client.stream_content(self.prompt, timeout=self.net_timeout)
+            else:
+                options = dict(self.options, stream=True)
+                if self.provider != 'custom':
+                    # Usage (incl. cached tokens) arrives in a final chunk; custom servers may reject the option
+                    options["stream_options"] = {"include_usage": True}
+                for chunk in self.openai_client().chat.completions.create(**options):
+                    if getattr(chunk, "usage", None) is not None:
+                        PromptCacheStats.record_openai(chunk)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+
+
+def request_llm(prompt, config):
+    """Sends the prompt to the selected provider, bypassing the response cache."""
+    if config.get('emulate') == 'yes':
+        print("Fake request: ", prompt)
+        return f"This is a fake response for emulation mode for the prompt {prompt}."
+    return ProviderRequest(prompt, config).send()
+
+
+def stream_prompt_to_llm(prompt, response_format="text", config=None):
+    """
+    Streaming counterpart of send_prompt_to_llm: yields the response text piece by piece.
+    A cached response is yielded in one piece; a completed stream is stored in the cache.
+    """
+    if config is None:
+        config = load_request_config()
+    cache = get_response_cache(config)
+    key = get_cache_key(config, prompt, response_format) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    tokens = check_prompt_size(prompt, config)
+    limiter = get_rate_limiter(config)
+    if limiter is not None:
+        limiter.acquire(tokens)
+
+    parts = []
+    for text in stream_llm(prompt, config):
+        parts.append(text)
+        yield text
+
+    response = "".join(parts).strip()
+    if cache is not None and response and is_cacheable(response, response_format):
+        cache.put(key, response)
+
+
+def stream_llm(prompt, config):
+    """Streams the prompt's response from the selected provider, bypassing the response cache."""
+    if config.get('emulate') == 'yes':
+        print("Fake streaming request: ", prompt)
+        for word in f"This is a fake response for emulation mode for the prompt {prompt}.".split(" "):
+            time.sleep(0.05)
+            yield word + " "
+        return
+    yield from ProviderRequest(prompt, config).stream()
+
+
+async def request_llm_async(prompt, config):
+    """Async counterpart of request_llm, bypassing the response cache."""
+    if config.get('emulate') == 'yes':
+        print("Fake request: ", prompt)
+        return f"This is a fake response for emulation mode for the prompt {prompt}."
+    return await ProviderRequest(prompt, config).send_async()
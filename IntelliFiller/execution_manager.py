@@ -1,6 +1,8 @@
 from collections import deque
 import threading
 
+from .rate_limiter import RateLimiter
+
 class ExecutionManager:
     _instance = None
     _lock = threading.Lock()
@@ -17,6 +19,19 @@ class ExecutionManager:
         self.queue = deque()
         self.current_task = None
         self.queue_lock = threading.Lock()
+        # provider -> RateLimiter, shared by every job so parallel runs respect one quota
+        self.rate_limiters = {}
+
+    def get_rate_limiter(self, provider, rpm, tpm):
+        """Returns the shared limiter for a provider, updating its budgets if settings changed."""
+        with self.queue_lock:
+            limiter = self.rate_limiters.get(provider)
+            if limiter is None:
+                limiter = RateLimiter(rpm, tpm)
+                self.rate_limiters[provider] = limiter
+            else:
+                limiter.configure(rpm, tpm)
+            return limiter
 
     def enqueue(self, task):
         """
@@ -0,0 +1,111 @@
+import re
+import threading
+from functools import lru_cache
+from html.parser import HTMLParser
+
+MEDIA_PATTERN = re.compile(r'\[sound:[^\]]*\]')
+# An innermost {{c1::text::hint}} cloze: neither its text nor its hint contains another cloze
+CLOZE_PATTERN = re.compile(r'\{\{c\d+::((?:(?!\{\{|\}\}|::).)*)(?:::(?:(?!\{\{|\}\}).)*)?\}\}', re.DOTALL)
+SPACE_PATTERN = re.compile(r'[^\S\n]+')
+NEWLINE_PATTERN = re.compile(r' ?\n[\s]*')
+
+# Tags that start a new line when removed
+BLOCK_TAGS = {"br", "div", "p", "li", "tr", "ul", "ol", "table", "h1", "h2", "h3", "h4", "h5", "h6", "hr"}
+# Tags whose content is never text
+SKIP_TAGS = {"style", "script", "head", "title"}
+
+# Off unless a prompt opts in: cleaning changes the rendered prompt, its cache key and fill-state hash
+DEFAULT_OPTIONS = {
+    "enabled": False,
+    "stripMedia": True,
+    "unwrapCloze": True,
+}
+
+
+def get_normalize_options(prompt_config):
+    """Returns (strip_media, unwrap_cloze) for the prompt, or None if normalization is turned off."""
+    options = {**DEFAULT_OPTIONS, **(prompt_config.get("normalize") or {})}
+    if not options["enabled"]:
+        return None
+    return bool(options["stripMedia"]), bool(options["unwrapCloze"])
+
+
+class TextExtractor(HTMLParser):
+    """Collects the text of an HTML fragment; entities are decoded by the parser as it goes."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html):
+    if "<" not in html and "&" not in html:
+        return html
+    parser = TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return "".join(parser.parts)
+
+
+class NormalizerStats:
+    """Characters in and out of the normalizer, so a run can report what it saved."""
+    lock = threading.Lock()
+    raw_chars = 0
+    normalized_chars = 0
+
+    @classmethod
+    def record(cls, raw, normalized):
+        with cls.lock:
+            cls.raw_chars += raw
+            cls.normalized_chars += normalized
+
+    @classmethod
+    def snapshot(cls):
+        with cls.lock:
+            return cls.raw_chars, cls.normalized_chars
+
+
+@lru_cache(maxsize=8192)
+def _normalize(value, strip_media, unwrap_cloze):
+    if strip_media:
+        value = MEDIA_PATTERN.sub("", value)
+    if unwrap_cloze:
+        # Nested clozes unwrap from the inside out, one level per pass
+        count = 1
+        while count:
+            value, count = CLOZE_PATTERN.subn(r"\1", value)
+    text = html_to_text(value)
+    # nbsp runs, tabs and repeated spaces become one space; blank lines collapse to one line break
+    text = SPACE_PATTERN.sub(" ", text)
+    text = NEWLINE_PATTERN.sub("\n", text)
+    return text.strip()
+
+
+def normalize_field(value, options):
+    """
+    Reduces a field value to the text the model needs: no HTML, media references or cloze markup,
+    collapsed whitespace. Results are cached per value, so repeated values cost one dict lookup.
+    """
+    normalized = _normalize(value, *options)
+    NormalizerStats.record(len(value), len(normalized))
+    return normalized
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .config_manager import ConfigManager
+from .field_normalizer import get_normalize_options
+from .note_filter import get_source_fields, get_target_fields
+
+
+def hash_values(values):
+    """64-bit fingerprint of a list of strings, stored as a signed SQLite integer."""
+    digest = hashlib.blake2b("\x1f".join(values).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def get_prompt_key(prompt_config):
+    # Prompts are identified by name so editing the template counts as a change, not a new prompt
+    return prompt_config.get("promptName") or "template:" + str(hash_values([prompt_config.get("prompt", "")]))
+
+
+def get_template_hash(prompt_config):
+    """Fingerprint of everything in the prompt that shapes its output."""
+    return hash_values([
+        prompt_config.get("prompt", ""),
+        prompt_config.get("responseFormat", "text"),
+        json.dumps(get_target_fields(prompt_config)),
+        json.dumps(prompt_config.get("fieldMapping", {}), sort_keys=True),
+        json.dumps(get_normalize_options(prompt_config)),
+    ])
+
+
+class FillStateIndex:
+    """
+    Per (profile, prompt, note) record of the last successful fill in user_files/fill_state/fill_state.sqlite3:
+    a hash of the prompt's input field values and a hash of the template. Lets a run process only the
+    notes whose inputs or template changed since, without tagging notes.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls(os.path.join(ConfigManager.FILL_STATE_DIR, "fill_state.sqlite3"))
+        return cls._instance
+
+    def __init__(self, path):
+        self.db_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS fill_state ("
+            " profile TEXT NOT NULL,"
+            " prompt TEXT NOT NULL,"
+            " nid INTEGER NOT NULL,"
+            " input_hash INTEGER NOT NULL,"
+            " template_hash INTEGER NOT NULL,"
+            " filled REAL NOT NULL,"
+            " PRIMARY KEY (profile, prompt, nid)) WITHOUT ROWID"
+        )
+
+    def record(self, profile, rows):
+        """rows: (prompt key, nid, input hash, template hash) of fills that reached the collection."""
+        now = time.time()
+        with self.db_lock:
+            self.db.execute("BEGIN")
+            try:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO fill_state (profile, prompt, nid, input_hash, template_hash, filled)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    [(profile, key, nid, input_hash, template_hash, now) for key, nid, input_hash, template_hash in rows]
+                )
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def load(self, profile, prompt_key):
+        """Returns {nid: (input hash, template hash)} for every note filled with the prompt; one range scan."""
+        with self.db_lock:
+            rows = self.db.execute(
+                "SELECT nid, input_hash, template_hash FROM fill_state WHERE profile = ? AND prompt = ?",
+                (profile, prompt_key)
+            ).fetchall()
+        return {nid: (input_hash, template_hash) for nid, input_hash, template_hash in rows}
+
+
+class FillStateRecorder:
+    """
+    Collects the fingerprints of one job's successful steps until their notes are written.
+    capture() runs on the event loop, commit() on the main thread once a chunk is saved.
+    """
+    def __init__(self, profile, configs):
+        self.profile = profile
+        self.steps = [(get_prompt_key(c), get_template_hash(c), get_source_fields(c)) for c in configs]
+        self.pending = {} # nid -> [(prompt key, nid, input hash, template hash)]
+        self.lock = threading.Lock()
+
+    def capture(self, note, step):
+        """Fingerprints the step's inputs as the note holds them right before its prompt is rendered."""
+        key, template_hash, sources = self.steps[step]
+        return key, note.id, hash_values([note[f] if f in note else "" for f in sources]), template_hash
+
+    def add(self, row):
+        with self.lock:
+            self.pending.setdefault(row[1], []).append(row)
+
+    def commit(self, nids):
+        with self.lock:
+            rows = [row for nid in nids for row in self.pending.pop(nid, [])]
+        if rows:
+            FillStateIndex.instance().record(self.profile, rows)
+
+
+def select_changed_notes(col, profile, note_ids, prompt_config):
+    """
+    Keeps the notes whose inputs or template changed since their last successful fill (or that were
+    never filled), for every step of a pipeline. Fields are read in bulk from the notes table.
+    Returns (note ids in selection order, number unchanged).
+    """
+    from anki.utils import ids2str
+
+    configs = prompt_config if isinstance(prompt_config, list) else [prompt_config]
+    index = FillStateIndex.instance()
+    steps = [(index.load(profile, get_prompt_key(c)), get_template_hash(c), get_source_fields(c)) for c in configs]
+
+    ordinals = {} # mid -> {field name: ord}
+    changed = set()
+    for nid, mid, flds in col.db.all(f"select id, mid, flds from notes where id in {ids2str(note_ids)}"):
+        if mid not in ordinals:
+            notetype = col.models.get(mid)
+            ordinals[mid] = {f['name']: f['ord'] for f in notetype['flds']} if notetype else {}
+        fields = flds.split("\x1f")
+        ords = ordinals[mid]
+        for states, template_hash, sources in steps:
+            state = states.get(nid)
+            if state is None or state[1] != template_hash:
+                changed.add(nid)
+                break
+            values = [fields[ords[f]] if f in ords and ords[f] < len(fields) else "" for f in sources]
+            if state[0] != hash_values(values):
+                changed.add(nid)
+                break
+
+    keep = [nid for nid in note_ids if nid in changed]
+    return keep, len(note_ids) - len(keep)
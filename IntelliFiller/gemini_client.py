@@ -1,12 +1,20 @@
 import httpx
 
+from .provider_errors import ProviderError, to_provider_error
+from .sse import iter_sse_data, raise_for_stream_status
+
 class GeminiClient:
-    def __init__(self, api_key, model="gemini-1.5-flash"):
+    def __init__(self, api_key, model="gemini-1.5-flash", http_client=None, async_http_client=None):
         self.api_key = api_key
         self.model = model
+        # Optional pooled httpx.Client; falls back to one-off module-level requests
+        self.http_client = http_client
+        # Optional pooled httpx.AsyncClient for generate_content_async
+        self.async_http_client = async_http_client
         self.base_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:generateContent"
+        self.stream_url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model}:streamGenerateContent"
 
-    def generate_content(self, prompt, timeout=60.0):
+    def _build_request(self, prompt):
         headers = {
             "Content-Type": "application/json"
         }
@@ -16,9 +24,19 @@ class GeminiClient:
                 "parts": [{"text": prompt}]
             }]
         }
+        return headers, data
+
+    @staticmethod
+    def _extract_text(result):
+        # Extract text from the response structure
+        # Response format: { "candidates": [ { "content": { "parts": [ { "text": "..." } ] } } ] }
+        return result['candidates'][0]['content']['parts'][0]['text']
+
+    def generate_content(self, prompt, timeout=60.0):
+        headers, data = self._build_request(prompt)
         
         try:
-            response = httpx.post(
+            response = (self.http_client or httpx).post(
                 self.base_url,
                 headers=headers,
                 params={"key": self.api_key},
@@ -26,9 +44,68 @@ class GeminiClient:
                 timeout=timeout
             )
             response.raise_for_status()
-            result = response.json()
-            # Extract text from the response structure
-            # Response format: { "candidates": [ { "content": { "parts": [ { "text": "..." } ] } } ] }
-            return result['candidates'][0]['content']['parts'][0]['text']
+            return self._extract_text(response.json())
+        except Exception as e:
+            error = to_provider_error("Gemini", e)
+            if error is e:
+                # Unexpected response shape etc.; not worth retrying
+                error = ProviderError(f"Error calling Gemini API: {str(e)}", retryable=False)
+            raise error from e
+
+    def stream_content(self, prompt, timeout=60.0):
+        """Yields the response text in pieces as the server streams it (alt=sse)."""
+        headers, data = self._build_request(prompt)
+
+        try:
+            with (self.http_client or httpx).stream(
+                "POST",
+                self.stream_url,
+                headers=headers,
+                params={"key": self.api_key, "alt": "sse"},
+                json=data,
+                timeout=timeout
+            ) as response:
+                raise_for_stream_status(response)
+                for chunk in iter_sse_data(response):
+                    # Each chunk is a partial GenerateContentResponse
+                    for candidate in chunk.get("candidates", [])[:1]:
+                        for part in candidate.get("content", {}).get("parts", []):
+                            if part.get("text"):
+                                yield part["text"]
+        except Exception as e:
+            error = to_provider_error("Gemini", e)
+            if error is e:
+                if isinstance(e, ProviderError):
+                    raise
+                error = ProviderError(f"Error calling Gemini API: {str(e)}", retryable=False)
+            raise error from e
+
+    async def generate_content_async(self, prompt, timeout=60.0):
+        headers, data = self._build_request(prompt)
+
+        try:
+            if self.async_http_client is not None:
+                response = await self.async_http_client.post(
+                    self.base_url,
+                    headers=headers,
+                    params={"key": self.api_key},
+                    json=data,
+                    timeout=timeout
+                )
+            else:
+                async with httpx.AsyncClient() as client:
+                    response = await client.post(
+                        self.base_url,
+                        headers=headers,
+                        params={"key": self.api_key},
+                        json=data,
+                        timeout=timeout
+                    )
+            response.raise_for_status()
+            return self._extract_text(response.json())
         except Exception as e:
-            raise Exception(f"Error calling Gemini API: {str(e)}")
+            error = to_provider_error("Gemini", e)
+            if error is e:
+                # Unexpected response shape etc.; not worth retrying
+                error = ProviderError(f"Error calling Gemini API: {str(e)}", retryable=False)
+            raise error from e
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from .config_manager import ConfigManager
+
+
+def hash_prompt_config(prompt_config):
+    payload = json.dumps(prompt_config, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class JobJournal:
+    """
+    Crash-safe record of a bulk run in user_files/jobs/<profile>, so each profile only sees its own jobs.
+    <id>.json holds the selection and prompt config and is written once; <id>.bitmap holds one bit
+    per selected note and is rewritten each time a chunk of notes reaches the collection.
+    Finished or cancelled jobs delete both files, so whatever is left over was interrupted.
+    """
+    def __init__(self, data, bitmap):
+        self.data = data
+        self.bitmap = bitmap
+        self.positions = {nid: i for i, nid in enumerate(data["noteIds"])}
+        self.lock = threading.Lock()
+        self.closed = False
+
+    @property
+    def id(self):
+        return self.data["id"]
+
+    @property
+    def name(self):
+        return self.data.get("name") or "Unnamed job"
+
+    @property
+    def prompt_config(self):
+        return self.data["promptConfig"]
+
+    @staticmethod
+    def directory(profile):
+        return os.path.join(ConfigManager.JOBS_DIR, profile)
+
+    @classmethod
+    def path(cls, profile, job_id, ext):
+        return os.path.join(cls.directory(profile), f"{job_id}.{ext}")
+
+    @classmethod
+    def create(cls, profile, note_ids, prompt_config, name=None):
+        data = {
+            "profile": profile,
+            "id": time.strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6],
+            "name": name,
+            "created": time.time(),
+            "configHash": hash_prompt_config(prompt_config),
+            "promptConfig": prompt_config,
+            "noteIds": list(note_ids),
+        }
+        journal = cls(data, bytearray((len(note_ids) + 7) // 8))
+        os.makedirs(cls.directory(profile), exist_ok=True)
+        ConfigManager._write_file_safely(cls.path(profile, journal.id, "json"), json.dumps(data))
+        journal._save_bitmap()
+        return journal
+
+    @classmethod
+    def load(cls, profile, job_id):
+        with open(cls.path(profile, job_id, "json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        data["profile"] = profile
+        bitmap = bytearray((len(data["noteIds"]) + 7) // 8)
+        try:
+            with open(cls.path(profile, job_id, "bitmap"), "rb") as f:
+                saved = f.read()
+            bitmap[:len(saved)] = saved[:len(bitmap)]
+        except OSError:
+            pass # Crashed before the first commit
+        return cls(data, bitmap)
+
+    @classmethod
+    def list_unfinished(cls, profile):
+        journals = []
+        directory = cls.directory(profile)
+        if not os.path.exists(directory):
+            return journals
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                journals.append(cls.load(profile, filename[:-len(".json")]))
+            except Exception as e:
+                print(f"[IntelliFiller] Error loading job journal {filename}: {e}")
+        return journals
+
+    def is_done(self, position):
+        return bool(self.bitmap[position >> 3] & (1 << (position & 7)))
+
+    def completed_count(self):
+        return sum(bin(byte).count("1") for byte in self.bitmap)
+
+    def remaining_note_ids(self):
+        return [nid for i, nid in enumerate(self.data["noteIds"]) if not self.is_done(i)]
+
+    def mark_done(self, nids):
+        """Records notes that reached the collection; called at every commit boundary."""
+        with self.lock:
+            if self.closed:
+                return
+            for nid in nids:
+                position = self.positions.get(nid)
+                if position is not None:
+                    self.bitmap[position >> 3] |= 1 << (position & 7)
+            self._save_bitmap()
+
+    def _save_bitmap(self):
+        path = self.path(self.data["profile"], self.id, "bitmap")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.bitmap)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        """The job finished or was cancelled on purpose: nothing to resume."""
+        with self.lock:
+            self.closed = True
+            for ext in ("json", "bitmap"):
+                try:
+                    os.remove(self.path(self.data["profile"], self.id, ext))
+                except OSError:
+                    pass
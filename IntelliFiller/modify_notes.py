@@ -21,7 +21,8 @@ def fill_field_for_note_in_editor(response, target_field, editor, overwrite):
     editor.loadNoteKeepingFocus()
 
 
-def fill_field_for_note_not_in_editor(response, note, target_field, overwrite):
-    """Set response to the note."""
+def fill_field_for_note_not_in_editor(response, note, target_field, overwrite, flush=True):
+    """Set response to the note. With flush=False the caller saves the note later."""
     format_response_and_fill_field(response, note, target_field, overwrite)
-    note.flush()
+    if flush:
+        note.flush()
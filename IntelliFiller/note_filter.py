@@ -0,0 +1,88 @@
+from .prompt_template import FIELD_REF_PATTERN
+
+
+def get_skip_rules(prompt_config):
+    """Returns the prompt's skip rules, or None if none are enabled."""
+    skip = prompt_config.get("skip") or {}
+    rules = {
+        "targetFilled": bool(skip.get("targetFilled", False)),
+        "sourceEmpty": bool(skip.get("sourceEmpty", False)),
+        "tags": [tag for tag in skip.get("tags", []) if tag.strip()],
+    }
+    if not (rules["targetFilled"] or rules["sourceEmpty"] or rules["tags"]):
+        return None
+    return rules
+
+
+def get_target_fields(prompt_config):
+    if prompt_config.get("responseFormat", "text") == "json":
+        return list(prompt_config.get("fieldMapping", {}).values())
+    return [prompt_config["targetField"]] if prompt_config.get("targetField") else []
+
+
+def get_source_fields(prompt_config):
+    return list(dict.fromkeys(FIELD_REF_PATTERN.findall(prompt_config.get("prompt", ""))))
+
+
+def build_needs_work_search(col, prompt_config, rules):
+    """
+    Compiles the skip rules into one Anki search matching the notes that still need this prompt:
+    some target field empty, every source field filled, none of the skip tags.
+    """
+    from anki.collection import SearchNode
+
+    nodes = []
+    targets = get_target_fields(prompt_config)
+    if rules["targetFilled"] and targets:
+        empty_targets = [SearchNode(field_name=SearchNode.Field(field_name=f, text="")) for f in targets]
+        nodes.append(col.group_searches(*empty_targets, joiner="OR") if len(empty_targets) > 1 else empty_targets[0])
+    if rules["sourceEmpty"]:
+        for field in get_source_fields(prompt_config):
+            # "_*" = at least one character
+            nodes.append(SearchNode(field_name=SearchNode.Field(field_name=field, text="_*")))
+    for tag in rules["tags"]:
+        nodes.append(SearchNode(negated=SearchNode(tag=tag)))
+    return col.build_search_string(*nodes) if nodes else ""
+
+
+def needs_work(note, prompt_config, rules):
+    """Python version of the compiled search, for Anki versions without SearchNode."""
+    targets = [f for f in get_target_fields(prompt_config) if f in note]
+    if rules["targetFilled"] and targets and all(note[f].strip() for f in targets):
+        return False
+    if rules["sourceEmpty"] and any(f in note and not note[f].strip() for f in get_source_fields(prompt_config)):
+        return False
+    if rules["tags"] and any(note.has_tag(tag) for tag in rules["tags"]):
+        return False
+    return True
+
+
+def filter_notes(col, note_ids, prompt_config):
+    """
+    Drops selected notes that every step's skip rules say need no work.
+    Returns (note ids to process in selection order, number skipped).
+    """
+    configs = prompt_config if isinstance(prompt_config, list) else [prompt_config]
+    rules = [get_skip_rules(c) for c in configs]
+    if not note_ids or any(r is None for r in rules):
+        # Some step always runs, so every note needs work
+        return list(note_ids), 0
+
+    try:
+        searches = [build_needs_work_search(col, c, r) for c, r in zip(configs, rules)]
+        query = col.build_search_string(*searches, joiner="OR") if len(searches) > 1 else searches[0]
+        # One search over the collection, intersected with the selection
+        matches = set(col.find_notes(query))
+        keep = [nid for nid in note_ids if nid in matches]
+    except Exception as e:
+        print(f"[IntelliFiller] Skip search unavailable ({e}); checking notes one by one.")
+        keep = []
+        for nid in note_ids:
+            try:
+                note = col.get_note(nid)
+            except Exception:
+                continue
+            if any(needs_work(note, c, r) for c, r in zip(configs, rules)):
+                keep.append(nid)
+
+    return keep, len(note_ids) - len(keep)
@@ -0,0 +1,52 @@
+import queue
+import threading
+
+# Marks the end of the selection in the queue
+_DONE = object()
+
+
+class NotePrefetcher(threading.Thread):
+    """
+    Prefetch/render stage of the bulk pipeline.
+    Loads notes and renders their prompts on its own thread, ahead of the request stage,
+    through a bounded queue: when the consumer falls behind, put() blocks and the stage
+    stops reading, so memory stays flat however large the selection is.
+    """
+    def __init__(self, items, prepare, depth):
+        super().__init__(daemon=True)
+        self.items = items
+        # prepare(item) -> (note, prompt, error); runs on this thread
+        self.prepare = prepare
+        self.queue = queue.Queue(maxsize=max(1, int(depth)))
+        self.stopped = threading.Event()
+
+    def run(self):
+        for index, item in enumerate(self.items):
+            try:
+                prepared = self.prepare(item)
+            except Exception as e:
+                prepared = (None, None, e)
+            if not self._put((index, prepared)):
+                return
+        self._put(_DONE)
+
+    def _put(self, entry):
+        # Re-check the stop flag periodically so a cancelled job never leaves this thread blocked
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def next(self, timeout=0.1):
+        """
+        Returns (index, (note, prompt, error)), None at the end of the selection,
+        or raises queue.Empty if nothing arrived within the timeout.
+        """
+        entry = self.queue.get(timeout=timeout)
+        return None if entry is _DONE else entry
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,173 @@
+import json
+from concurrent.futures import Future, InvalidStateError
+
+from .data_request import parse_llm_json
+
+PACK_HEADER = (
+    "You will receive several independent tasks as a JSON array. Each task has an \"id\" and a \"task\".\n"
+    "Solve every task on its own, exactly as if it had been sent alone.\n"
+    "Reply with ONLY a JSON object that maps each task id to its answer, e.g. {\"1\": ..., \"2\": ...}.\n"
+)
+
+TEXT_ANSWER_HINT = "Each answer must be a string containing the full reply to that task.\n"
+JSON_ANSWER_HINT = "Each answer must be the JSON object that its task asks for.\n"
+
+
+def get_packing_config(prompt_config):
+    """Returns (max_notes, max_tokens) if packing is enabled for this prompt, else None."""
+    packing = prompt_config.get("packing") or {}
+    if not packing.get("enabled", False):
+        return None
+    max_notes = max(1, int(packing.get("maxNotes", 20)))
+    max_tokens = max(1, int(packing.get("maxTokens", 3000)))
+    if max_notes < 2:
+        return None
+    return max_notes, max_tokens
+
+
+def get_pack_output_tokens(prompt_config, count, default):
+    """Output token limit for a packed request of count notes: room for every answer, never below default."""
+    packing = prompt_config.get("packing") or {}
+    per_note = max(1, int(packing.get("outputTokensPerNote", 300)))
+    cap = max(1, int(packing.get("maxOutputTokens", 8192)))
+    # A little extra for the surrounding JSON object
+    return max(default, min(cap, 200 + per_note * count))
+
+
+def estimate_pack_tokens(prompt, estimator):
+    # Per-task cost inside the packed array (JSON quoting adds a little overhead)
+    return estimator.estimate(prompt) + 8
+
+
+def build_packed_prompt(prompts, response_format):
+    tasks = [{"id": str(i + 1), "task": prompt} for i, prompt in enumerate(prompts)]
+    hint = JSON_ANSWER_HINT if response_format == "json" else TEXT_ANSWER_HINT
+    # One task per line keeps the array readable without indentation overhead
+    tasks_json = "[\n" + ",\n".join(json.dumps(task, ensure_ascii=False) for task in tasks) + "\n]"
+    return PACK_HEADER + hint + "\nTasks:\n" + tasks_json
+
+
+def recover_truncated_answers(text):
+    """
+    Reads the complete entries of a packed answer that was cut off (e.g. by the output token limit).
+    Returns {id: answer} for every "id": answer pair (or {"id", "answer"} item) that is followed by
+    a separator or the closing bracket, or None if no complete entry was found.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    pos = min(starts)
+    closing = "}" if text[pos] == "{" else "]"
+    decoder = json.JSONDecoder()
+
+    def skip_space(i):
+        while i < len(text) and text[i].isspace():
+            i += 1
+        return i
+
+    data = {}
+    pos += 1
+    while True:
+        try:
+            pos = skip_space(pos)
+            if closing == "}":
+                key, pos = decoder.raw_decode(text, pos)
+                pos = skip_space(pos)
+                if not isinstance(key, str) or text[pos:pos + 1] != ":":
+                    break
+                value, pos = decoder.raw_decode(text, skip_space(pos + 1))
+            else:
+                item, pos = decoder.raw_decode(text, pos)
+                if not isinstance(item, dict):
+                    break
+                key, value = str(item.get("id")), item.get("answer")
+        except ValueError:
+            break # The entry was cut off
+        pos = skip_space(pos)
+        # A value at the very end may itself be cut short (e.g. a number), so it needs its separator
+        if text[pos:pos + 1] not in (",", closing):
+            break
+        data[key] = value
+        if text[pos] == closing:
+            break
+        pos += 1
+    return data or None
+
+
+def split_packed_response(response, count, response_format):
+    """
+    Splits a packed answer into {task index: response string}.
+    Missing or malformed entries are simply absent so the caller can retry just those notes.
+    """
+    data = parse_llm_json(response)
+    if data is None:
+        # Cut-off answers still carry the notes answered before the cut
+        data = recover_truncated_answers(response)
+
+    # Accept [{"id": .., "answer": ..}] as well as the requested {"id": answer} object
+    if isinstance(data, list):
+        data = {str(item.get("id")): item.get("answer") for item in data if isinstance(item, dict)}
+    if not isinstance(data, dict):
+        return {}
+
+    answers = {}
+    for key, value in data.items():
+        try:
+            index = int(str(key).strip()) - 1
+        except ValueError:
+            continue
+        if not 0 <= index < count or value is None:
+            continue
+
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, ensure_ascii=False)
+        elif not isinstance(value, str):
+            value = str(value)
+
+        if response_format == "json" and parse_llm_json(value) is None:
+            continue
+        if not value.strip():
+            continue
+        answers[index] = value
+    return answers
+
+
+class NotePack:
+    """
+    Notes collected for one packed request.
+    future resolves to the processed notes in pack order once the request has been submitted and finished.
+    """
+    def __init__(self):
+        self.notes = []
+        self.prompts = []
+        self.tokens = 0
+        self.future = Future()
+        self.task = None
+        # Abandoning the pack (cancel/restart) also abandons its request
+        self.future.add_done_callback(self._on_done)
+
+    def add(self, note, prompt, tokens):
+        slot = len(self.notes)
+        self.notes.append(note)
+        self.prompts.append(prompt)
+        self.tokens += tokens
+        return slot
+
+    def attach(self, task):
+        self.task = task
+        task.add_done_callback(self._resolve)
+
+    def _resolve(self, task):
+        try:
+            if task.cancelled():
+                self.future.cancel()
+            elif task.exception() is not None:
+                self.future.set_exception(task.exception())
+            else:
+                self.future.set_result(task.result())
+        except InvalidStateError:
+            pass # Already cancelled by the worker
+
+    def _on_done(self, future):
+        if future.cancelled() and self.task is not None:
+            self.task.cancel()
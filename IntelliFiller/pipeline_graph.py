@@ -0,0 +1,28 @@
+from .note_filter import get_source_fields, get_target_fields
+
+
+def build_step_dependencies(configs):
+    """
+    Analyzes pipeline steps into a DAG. Returns, per step, the indices of earlier steps it must wait for:
+    - it reads a field an earlier step writes (its {{{Field}}} references vs. targetField/fieldMapping),
+    - it writes a field an earlier step reads (that step must render its prompt from the old value first),
+    - it writes a field an earlier step also writes (the later step still wins, as in list order).
+    Steps with no such relation run concurrently on the same note.
+    """
+    reads = [set(get_source_fields(config)) for config in configs]
+    writes = [set(get_target_fields(config)) for config in configs]
+    dependencies = []
+    for step in range(len(configs)):
+        dependencies.append(tuple(
+            earlier for earlier in range(step)
+            if reads[step] & writes[earlier] or writes[step] & reads[earlier] or writes[step] & writes[earlier]
+        ))
+    return dependencies
+
+
+def critical_path_length(dependencies):
+    """Number of steps on the longest dependency chain, i.e. sequential requests per note."""
+    depth = []
+    for deps in dependencies:
+        depth.append(1 + max((depth[i] for i in deps), default=0))
+    return max(depth, default=0)
@@ -1,51 +1,140 @@
 from aqt.qt import QThread, pyqtSignal, QDialog, QVBoxLayout, QHBoxLayout, QProgressBar, QPushButton, QLabel, QLineEdit, Qt, QAction, QStyle, QApplication, QIcon, QTimer
 from aqt import mw
-from aqt.utils import showWarning
+from aqt.utils import showWarning, tooltip
+from aqt.browser import Browser
 
-from .data_request import create_prompt, send_prompt_to_llm
-from .modify_notes import fill_field_for_note_in_editor, fill_field_for_note_not_in_editor
+from .data_request import create_prompt, get_cache_key, get_response_cache, send_prompt_to_llm, send_prompt_to_llm_async, stream_prompt_to_llm, parse_llm_json, get_rate_limiter
+from .modify_notes import fill_field_for_note_in_editor, fill_field_for_note_not_in_editor, format_response_and_fill_field
 from .config_manager import ConfigManager
 from .execution_manager import ExecutionManager
+from .async_runner import AsyncRunner
+from .retry_policy import RetryPolicy
+from .batch_jobs import BatchJobManager
+from .write_buffer import NoteWriteBuffer
+from .collection_writer import CollectionWriter
+from .note_filter import filter_notes
+from .job_journal import JobJournal
+from .note_prefetcher import NotePrefetcher
+from .prompt_template import get_template, check_templates
+from .field_normalizer import NormalizerStats
+from .token_estimator import get_estimator, get_input_budget
+from .prompt_cache import PromptCacheStats
+from .pipeline_graph import build_step_dependencies, critical_path_length
+from .fill_state import FillStateRecorder, select_changed_notes
+from .browser_refresh import BrowserRefresher
+from .packing import NotePack, get_packing_config, get_pack_output_tokens, estimate_pack_tokens, build_packed_prompt, split_packed_response
 from anki.notes import Note, NoteId
+from anki.utils import ids2str
+from collections import deque
+import queue
+import heapq
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import asyncio
 import sys
 import time
 import random
 import os
 
-def get_deck_name(note):
-    try:
-        if note.cards():
-            did = note.cards()[0].did
-            deck = mw.col.decks.get(did)
-            if deck:
-                return deck['name']
-    except:
-        pass
-    return "Unknown Deck"
+class DeckNameTable:
+    """
+    Deck name of each note's first card for a whole selection, resolved up front with one query.
+    Names are stored once per deck; notes map to an index into that list.
+    """
+    UNKNOWN = "Unknown Deck"
+
+    def __init__(self, col, items):
+        self.names = []
+        self.index = {} # nid -> position in names
+
+        nids = [item.id if isinstance(item, Note) else item for item in items]
+        nids = [nid for nid in nids if nid]
+        if not nids:
+            return
+
+        positions = {} # did -> position in names
+        try:
+            # Cards come back grouped by note, first card (lowest ord) first
+            rows = col.db.all(f"select nid, did from cards where nid in {ids2str(nids)} order by nid, ord")
+            for nid, did in rows:
+                if nid in self.index:
+                    continue
+                if did not in positions:
+                    deck = col.decks.get(did, default=False)
+                    positions[did] = len(self.names)
+                    self.names.append(deck['name'] if deck else self.UNKNOWN)
+                self.index[nid] = positions[did]
+        except Exception as e:
+            print(f"[IntelliFiller] Deck lookup failed: {e}")
+
+    def get(self, nid):
+        position = self.index.get(nid)
+        return self.names[position] if position is not None else self.UNKNOWN
 
 class MultipleNotesThreadWorker(QThread):
     progress_made = pyqtSignal(int)
     status_update = pyqtSignal(str)
     deck_update = pyqtSignal(str)
-    refresh_browser = pyqtSignal()
+    refresh_browser = pyqtSignal(list) # Ids of notes written to the collection
+    dedupe_update = pyqtSignal(int, int) # (prompts requested, prompts answered by an identical earlier request)
     # error_occurred = pyqtSignal(str) # No longer needed for UI, we use stderr directly
 
-    def __init__(self, notes, browser, prompt_config):
+    def __init__(self, notes, browser, prompt_config, config=None, journal=None):
         super().__init__()
         self.notes = notes
         self.browser = browser
         self.prompt_config = prompt_config
         self.has_shown_error = False
+        # Settings + credentials resolved once for the whole job and passed to every request
+        self.config = config if config is not None else ConfigManager.get_snapshot()
         
         # Load Batch Settings
-        settings = ConfigManager.load_settings()
-        batch_cfg = settings.get("batchProcessing", {})
+        batch_cfg = self.config.get("batchProcessing", {})
         self.batch_enabled = batch_cfg.get("enabled", True)
         self.batch_size = batch_cfg.get("batchSize", 20)
         self.batch_delay = batch_cfg.get("batchDelay", 5)
         self.random_delay = batch_cfg.get("randomDelay", True)
         self.random_min = batch_cfg.get("randomDelayMin", 0)
         self.random_max = batch_cfg.get("randomDelayMax", 10)
+        # Number of notes whose requests may be in flight at the same time
+        self.concurrency = max(1, int(batch_cfg.get("concurrency", 1)))
+        # Finished notes are written in chunks of this size (one transaction each)
+        # Writes go through the main-thread CollectionWriter; this thread never writes to mw.col
+        self.write_buffer = NoteWriteBuffer(batch_cfg.get("writeChunkSize", 50), on_written=self.on_notes_written)
+        self.original_fields = {} # nid -> field values when fetched, to post only what changed
+        # Persistent progress record so a crashed run can be resumed
+        self.journal = journal
+        # With a provider budget configured, the shared token bucket paces requests
+        # and the fixed batch pauses are skipped
+        self.rate_limited = get_rate_limiter(self.config) is not None
+        self.retry_policy = RetryPolicy.from_config(self.config)
+        # Multi-note packing (single prompts only; pipeline steps build on each other per note)
+        self.packing = get_packing_config(prompt_config) if isinstance(prompt_config, dict) else None
+        self.pending_pack = None
+        # Identical prompts share one request: cache key digest -> [asyncio future, waiter count]. Without a
+        # response cache answered entries stay for the whole job; with one, the cache answers repeats
+        self.shared_requests = {}
+        self.response_cache = get_response_cache(self.config)
+        self.prompt_count = 0
+        self.reused_count = 0
+        # Prompt templates compiled once per job; render plans are resolved per notetype on first use
+        configs = prompt_config if isinstance(prompt_config, list) else [prompt_config]
+        self.prompt_configs = configs
+        self.templates = [get_template(c) for c in configs]
+        # Offline token estimates for the selected model; per-step input budgets (None = unlimited)
+        self.estimator = get_estimator(self.config)
+        self.input_budgets = [get_input_budget(c, self.estimator) for c in configs]
+        # Size report: running totals over rendered prompts plus the five largest as (tokens, nid)
+        self.size_lock = threading.Lock()
+        self.prompt_count_sized = 0
+        self.prompt_tokens_total = 0
+        self.largest_prompts = []
+        # Pipeline steps as a DAG: per step, the earlier steps whose fields it reads or writes
+        self.step_dependencies = build_step_dependencies(configs)
+        # Input/template fingerprints of successful steps, stored once their notes are written
+        self.fill_state = FillStateRecorder(mw.pm.name, configs)
+        if len(configs) > 1:
+            print(f"[IntelliFiller] Pipeline: {len(configs)} steps, {critical_path_length(self.step_dependencies)} sequential per note")
         
         self.run_permission = False
         self.is_user_paused = False
@@ -54,143 +143,578 @@ class MultipleNotesThreadWorker(QThread):
     def update_activity(self):
         self.last_activity = time.time()
 
+    def on_notes_written(self, nids):
+        # Commit boundary (runs on the main thread once the writer saved the chunk): record progress before telling the UI
+        if self.journal is not None:
+            try:
+                self.journal.mark_done(nids)
+            except Exception as e:
+                print(f"[IntelliFiller] Could not update job journal: {e}")
+        try:
+            self.fill_state.commit(nids)
+        except Exception as e:
+            print(f"[IntelliFiller] Could not update fill state: {e}")
+        self.refresh_browser.emit(nids)
+
     def set_permission(self, allowed: bool):
         self.run_permission = allowed
 
     def set_user_paused(self, paused: bool):
         self.is_user_paused = paused
 
-    def run(self):
-        total_notes = len(self.notes)
-        
-        for i, item in enumerate(self.notes):
+    def wait_for_permission(self, in_flight):
+        """Blocks while paused or queued. Returns False if the job was cancelled."""
+        while not self.run_permission:
+            if self.isInterruptionRequested():
+                return False
+
+            # Finish what is already on the wire before parking the job
+            if in_flight:
+                self.drain(in_flight)
+                continue
+            # Don't leave finished notes unsaved while parked
+            self.write_buffer.flush()
+
+            if self.is_user_paused:
+                self.status_update.emit("Paused by user. Click Resume to continue.")
+            else:
+                self.status_update.emit("Waiting in queue...")
+
+            time.sleep(0.1)
+        return True
+
+    def report_error(self, e):
+        # Logic: Immediate feedback, "Original Window", One time only.
+        if not self.has_shown_error:
+            sys.stderr.write(f"IntelliFiller Error: {str(e)}")
+            self.has_shown_error = True
+
+    def fetch_note(self, item):
+        """Returns the note for a queue item, or None if it no longer exists."""
+        try:
+            if isinstance(item, Note):
+                return item
+            # Assume it's a NoteId (int)
+            return mw.col.get_note(item)
+        except Exception:
+            # If note deleted or not found, skip
+            return None
+
+    def prepare_note(self, item):
+        """
+        Prefetch stage: loads the note and renders its (first) prompt, off the request path.
+        Later pipeline steps are rendered on the event loop since they read earlier steps' output.
+        Returns (note, prompt, error).
+        """
+        note = self.fetch_note(item)
+        if note is None:
+            return None, None, None
+        self.original_fields[note.id] = list(note.fields)
+        try:
+            prompt = self.templates[0].render(note, self.input_budgets[0])
+            self.record_prompt_size(note.id, prompt)
+            return note, prompt, None
+        except Exception as e:
+            return note, None, e
+
+    def check_templates(self):
+        """Reports field references a notetype in the selection can't satisfy, once per notetype instead of per note."""
+        configs = self.prompt_config if isinstance(self.prompt_config, list) else [self.prompt_config]
+        nids = [item.id if isinstance(item, Note) else item for item in self.notes]
+        try:
+            problems = check_templates(mw.col, nids, configs)
+        except Exception as e:
+            print(f"[IntelliFiller] Could not check prompt templates: {e}")
+            return
+        for prompt_name, notetype_name, count, error in problems:
+            print(f"[IntelliFiller] Prompt '{prompt_name}': {error} {count} note(s) of this type will be skipped.")
+        if problems:
+            self.report_error(problems[0][3])
+            # Notes of those types then fail fast with the cached message
+            skipped = sum({notetype_name: count for _, notetype_name, count, _ in problems}.values())
+            self.status_update.emit(f"{skipped} note(s) will be skipped: prompt fields missing from their note type")
+
+    def report_normalizer_savings(self, start):
+        raw, normalized = NormalizerStats.snapshot()
+        raw -= start[0]
+        normalized -= start[1]
+        if raw > normalized:
+            saved = int((raw - normalized) / self.estimator.chars_per_token)
+            print(f"[IntelliFiller] Field cleanup: {raw} -> {normalized} chars of field content (~{saved} input tokens saved)")
+
+    def report_prompt_cache(self, start):
+        input_tokens, cached, written = (now - then for now, then in zip(PromptCacheStats.snapshot(), start))
+        if input_tokens <= 0:
+            return
+        print(f"[IntelliFiller] Prompt cache: {cached} of {input_tokens} input tokens read from the provider cache "
+              f"({cached * 100 // input_tokens}%), {written} written")
+
+    def record_prompt_size(self, nid, prompt):
+        # Called from the prefetch thread and the event loop
+        tokens = self.estimator.estimate(prompt)
+        with self.size_lock:
+            self.prompt_count_sized += 1
+            self.prompt_tokens_total += tokens
+            if len(self.largest_prompts) < 5:
+                heapq.heappush(self.largest_prompts, (tokens, nid))
+            elif tokens > self.largest_prompts[0][0]:
+                heapq.heapreplace(self.largest_prompts, (tokens, nid))
+
+    def report_prompt_sizes(self):
+        """Size report: totals, the largest prompts and what the input budget did."""
+        if not self.prompt_count_sized:
+            return
+        total = self.prompt_tokens_total
+        largest = sorted(self.largest_prompts, reverse=True)
+        print(f"[IntelliFiller] Prompt sizes: {self.prompt_count_sized} prompt(s), ~{total} input tokens "
+              f"(avg ~{total // self.prompt_count_sized}, max ~{largest[0][0]})")
+        print("[IntelliFiller] Largest prompts: " + ", ".join(f"nid {nid} ~{tokens}" for tokens, nid in largest))
+        budgets = [budget for budget in self.input_budgets if budget is not None]
+        truncated = sum(budget.truncated for budget in budgets)
+        skipped = sum(budget.skipped for budget in budgets)
+        if truncated or skipped:
+            print(f"[IntelliFiller] Input budget: {truncated} prompt(s) truncated, {skipped} note(s) skipped")
+
+    def next_prepared(self, prefetcher):
+        """Waits for the next prepared note; None at the end of the selection or when cancelled."""
+        while not self.isInterruptionRequested():
+            try:
+                return prefetcher.next()
+            except queue.Empty:
+                # Request stage is waiting on the prefetcher; still alive
+                self.update_activity()
+        return None
+
+    async def request_with_retry(self, prompt, response_format, budget, config=None):
+        """
+        Sends one prompt, retrying retryable provider errors with backoff until the
+        note's retry budget runs out. Returns None if the job was cancelled.
+        config overrides the worker's config for this request (e.g. a larger output limit).
+        """
+        while True:
             self.update_activity()
-            # Check for pause before starting next item
-            # Check state before processing
-            while not self.run_permission:
-                if self.isInterruptionRequested():
-                    return
-                
-                if self.is_user_paused:
-                    self.status_update.emit("Paused by user. Click Resume to continue.")
-                else:
-                    self.status_update.emit("Waiting in queue...")
-                
-                time.sleep(0.1)
-                
-            if i > 0 and self.is_user_paused == False: # Only say resuming if we were actually ensuring progress
-                 # If we just came out of a wait, update status? 
-                 # Actually the loop above handles the wait. 
-                 pass
-
-            # Batch Processing Delay
-            # Check if enabled, if we hit the batch limit, and if it's NOT the last item
-            if self.batch_enabled and i > 0 and (i % self.batch_size == 0):
-                # We are about to process usage number 'i+1'. i is 0-indexed. 
-                # e.g. batch=5. i=0,1,2,3,4 (5 items done). Loop i=5 triggers check?
-                # Actually, standard is check after N items. 
-                # i starts at 0. processing item i. 
-                # We want to pause BEFORE item i if i is a multiple of batch_size.
-                
-                # Signal the UI to refresh the browser list so user sees progress
-                self.refresh_browser.emit()
-                
-                remaining = self.batch_delay
-                
-                if self.random_delay:
-                    extra = random.randint(self.random_min, self.random_max)
-                    self.status_update.emit(f"Adding random delay variance: +{extra}s")
-                    remaining += extra
-                
-                while remaining > 0:
-                    if self.isInterruptionRequested():
-                        return # Exit run immediately
-                    
-                    self.status_update.emit(f"Paused for batch limit... continuing in {remaining}s")
-                    time.sleep(1)
-                    remaining -= 1
-                
-                # Restore status text
-                self.status_update.emit(f"Resuming processing...")
+            if self.isInterruptionRequested():
+                return None
 
-            # Retry loop for the distinct note
-            while True:
+            try:
+                response = await send_prompt_to_llm_async(prompt, response_format, config or self.config)
                 self.update_activity()
+                return response
+            except Exception as e:
+                self.report_error(e)
+
+                delay = budget.next_delay(e)
+                if delay is None:
+                    # Auth/validation errors, unknown failures or budget exhausted: fail fast
+                    raise
+
+                reason = f"HTTP {e.status}" if getattr(e, "status", None) else "Network error"
+                self.status_update.emit(f"{reason}. Retrying in {delay:.0f}s (attempt {budget.attempts}/{budget.policy.max_retries})...")
+                # Sleep in slices so the watchdog sees we are alive and cancel stays responsive
+                while delay > 0:
+                    if self.isInterruptionRequested():
+                        return None
+                    self.update_activity() # Reset watchdog, we are alive and handling it
+                    await asyncio.sleep(min(delay, 1.0))
+                    delay -= 1.0
+
+    async def request_shared(self, prompt, response_format, budget):
+        """
+        Groups notes by rendered prompt: a note whose prompt matches an earlier one in the job gets that
+        request's response instead of sending its own. The lookup happens as soon as the note is
+        submitted, before a request slot is taken, so waiting notes never hold one.
+        Runs on the event loop thread only, so the table needs no lock.
+        """
+        key = get_cache_key(self.config, prompt, response_format)
+        self.prompt_count += 1
+        entry = self.shared_requests.get(key)
+        if entry is None and self.response_cache is not None:
+            # Repeats of prompts answered earlier; sqlite stays off the event loop
+            cached = await asyncio.get_running_loop().run_in_executor(None, self.response_cache.get, key)
+            if cached is not None:
+                self.reused_count += 1
+                self.dedupe_update.emit(self.prompt_count, self.reused_count)
+                return cached
+            entry = self.shared_requests.get(key)
+        if entry is None:
+            entry = self.shared_requests[key] = [asyncio.ensure_future(self.send_limited(prompt, response_format, budget)), 0]
+            entry[0].add_done_callback(lambda future: self.forget_request(key, entry))
+        else:
+            self.reused_count += 1
+        self.dedupe_update.emit(self.prompt_count, self.reused_count)
+
+        entry[1] += 1 # Waiters
+        try:
+            # Shielded so cancelling one waiting note doesn't cancel the request for the others
+            return await asyncio.shield(entry[0])
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not entry[0].done():
+                # Every note that wanted this answer is gone (cancel/restart); stop the request too
+                entry[0].cancel()
+
+    def forget_request(self, key, entry):
+        """
+        Drops a finished request from the table unless later notes may reuse its answer: failed or
+        cancelled requests are asked again, and with a response cache the cache answers repeats.
+        """
+        future = entry[0]
+        keep = (self.response_cache is None and not future.cancelled()
+                and future.exception() is None and future.result() is not None)
+        if not keep and self.shared_requests.get(key) is entry:
+            del self.shared_requests[key]
+
+    async def send_limited(self, prompt, response_format, budget):
+        """Sends a prompt once one of the job's request slots is free."""
+        async with self.semaphore:
+            return await self.request_with_retry(prompt, response_format, budget)
+
+    async def process_note_async(self, note, prompt=None):
+        """
+        Runs the full prompt (or pipeline) for a single note on the shared event loop.
+        prompt is the first step's prompt if the prefetch stage already rendered it.
+        Pipeline steps start as soon as the steps they depend on are done, so independent steps
+        run concurrently and the note takes as long as its longest dependency chain.
+        Responses are applied to the in-memory note only; the worker thread commits it.
+        Returns the note to commit, or None if the job was cancelled.
+        """
+        budget = self.retry_policy.new_budget()
+        committed = False
+
+        try:
+            # Requests take a slot of the semaphore themselves (send_limited)
+            if len(self.step_dependencies) == 1:
+                results = [await self.run_step(note, 0, prompt, (), budget)]
+            else:
+                steps = []
+                for step, dependencies in enumerate(self.step_dependencies):
+                    waits_for = [steps[i] for i in dependencies]
+                    steps.append(asyncio.ensure_future(self.run_step(note, step, prompt if step == 0 else None, waits_for, budget)))
+                results = await asyncio.gather(*steps)
+
+            if None in results:
+                return None
+            committed = True
+            return note
+        finally:
+            if not committed:
+                # Cancelled or crashed: commit_next won't write this note, so its snapshot goes now
+                self.original_fields.pop(note.id, None)
+
+    async def run_step(self, note, step, prompt, waits_for, budget):
+        """
+        Runs one pipeline step once the steps it depends on have finished.
+        Steps share the same note object and see each other's updates immediately.
+        Returns True if the step filled its fields, False if it failed or was skipped, None if cancelled.
+        """
+        if waits_for:
+            outcomes = await asyncio.gather(*waits_for)
+            if None in outcomes:
+                return None
+            if not all(outcomes):
+                # An input never got filled; the rest of the note's steps still run
+                return False
+
+        p_config = self.prompt_configs[step]
+        try:
+            fill = self.fill_state.capture(note, step)
+            if prompt is None:
+                prompt = self.templates[step].render(note, self.input_budgets[step])
+                self.record_prompt_size(note.id, prompt)
+            response = await self.request_shared(prompt, p_config.get("responseFormat", "text"), budget)
+            if response is None:
+                return None
+            apply_response_to_note(note, p_config, response, is_editor=False, flush=False)
+            self.fill_state.add(fill)
+            return True
+        except Exception as e:
+            # Logic/Template error -> skip this step and its dependents, keep what other steps produced
+            self.report_error(e)
+            return False
+
+    async def process_pack_async(self, notes, prompts):
+        """
+        Sends several notes' prompts as one packed request and applies each answer to its note.
+        Notes missing from the packed answer (or with unusable answers) are retried one by one.
+        Returns the notes in pack order; entries are None if the job was cancelled.
+        """
+        fmt = self.prompt_config.get("responseFormat", "text")
+        answers = {}
+        # The packed answer holds every note's answer, so the output limit grows with the pack
+        default_tokens = int(self.config.get("maxOutputTokens", 2000))
+        pack_config = {**self.config, "maxOutputTokens": get_pack_output_tokens(self.prompt_config, len(notes), default_tokens)}
+
+        async with self.semaphore:
+            try:
+                packed_prompt = build_packed_prompt(prompts, fmt)
+                response = await self.request_with_retry(packed_prompt, "json", self.retry_policy.new_budget(), pack_config)
+                if response is None:
+                    return [None] * len(notes)
+                answers = split_packed_response(response, len(notes), fmt)
+            except Exception as e:
+                # The whole pack failed; every note falls back to its own request below
+                self.report_error(e)
+
+        missing = []
+        for i, note in enumerate(notes):
+            if i not in answers:
+                missing.append(i)
+                continue
+            try:
+                fill = self.fill_state.capture(note, 0)
+                apply_response_to_note(note, self.prompt_config, answers[i], is_editor=False, flush=False)
+                self.fill_state.add(fill)
+            except Exception:
+                missing.append(i)
+
+        results = list(notes)
+        if missing:
+            self.status_update.emit(f"Packed answer incomplete, retrying {len(missing)} note(s) individually...")
+            retried = await asyncio.gather(*(self.process_note_async(notes[i], prompts[i]) for i in missing))
+            for i, note in zip(missing, retried):
+                results[i] = note
+        return results
+
+    def add_to_pack(self, index, note, prompt, in_flight):
+        """Queues a rendered note in the current pack, sending the pack once it is full."""
+        max_notes, max_tokens = self.packing
+        tokens = estimate_pack_tokens(prompt, self.estimator)
+        if self.pending_pack is not None and self.pending_pack.tokens + tokens > max_tokens:
+            self.submit_pack()
+        if self.pending_pack is None:
+            self.pending_pack = NotePack()
+
+        slot = self.pending_pack.add(note, prompt, tokens)
+        in_flight.append((index, self.pending_pack.future, slot))
+        if len(self.pending_pack.notes) >= max_notes:
+            self.submit_pack()
+
+    def submit_pack(self):
+        pack, self.pending_pack = self.pending_pack, None
+        if pack is not None:
+            pack.attach(AsyncRunner.instance().submit(self.process_pack_async(pack.notes, pack.prompts)))
+
+    def commit_next(self, in_flight):
+        """
+        Waits for the oldest in-flight note and writes it to the collection.
+        Notes are committed strictly in selection order, whatever order the requests finish in.
+        Returns False if the job was cancelled while waiting.
+        """
+        index, future, slot = in_flight[0]
+        if self.pending_pack is not None and future is self.pending_pack.future:
+            # Don't wait on a pack that was never sent
+            self.submit_pack()
+
+        note = None # Stays None for deleted notes and failed tasks
+        while future is not None:
+            if self.isInterruptionRequested():
+                return False
+            try:
+                result = future.result(timeout=0.1)
+                # Packed requests resolve to a list of notes; slot picks ours
+                note = result[slot] if slot is not None else result
+                break
+            except FutureTimeoutError:
+                continue
+            except Exception:
+                break
+
+        in_flight.popleft()
+        if note is not None:
+            # Update Deck Name info
+            self.deck_update.emit(self.deck_names.get(note.id))
+            self.write_buffer.add(note, self.original_fields.pop(note.id, None))
+
+            # Backpressure: don't run further ahead of the main thread's writer than a few chunks
+            writer = CollectionWriter.instance()
+            while not writer.wait_for_backlog(self.write_buffer.chunk_size * 4):
                 if self.isInterruptionRequested():
                     break
-                
-                # Fetch note once per note-processing loop to ensure pipeline steps share the same object
-                # and see each other's updates immediately (before flush/reload).
-                try:
-                    try:
-                        if isinstance(item, Note):
-                            note = item
-                        else:
-                            # Assume it's a NoteId (int)
-                            note = mw.col.get_note(item)
-                    except Exception:
-                        # If note deleted or not found, skip
-                        break # Break retry loop, effectively skipping this note
-                    
-                    # Update Deck Name info
-                    deck_name = get_deck_name(note)
-                    self.deck_update.emit(deck_name)
-
-                    # prompt_config can be a dict (single prompt) or list (pipeline)
-                    if isinstance(self.prompt_config, list):
-                        for p_config in self.prompt_config:
-                            enrich_without_editor(note, p_config)
-                    else:
-                        enrich_without_editor(note, self.prompt_config)
-                    
-                    # If we reached here, success!
-                    self.update_activity()
-                    break 
-
-                except Exception as e:
-                    err_str = str(e).lower()
-                    # Check for common network/timeout keywords
-                    is_net_error = any(x in err_str for x in ["connect", "time", "network", "socket", "proxy", "50", "429"])
-                    
-                    # Logic: Immediate feedback, "Original Window", One time only.
-                    if not self.has_shown_error:
-                        sys.stderr.write(f"IntelliFiller Error: {str(e)}")
-                        self.has_shown_error = True
-                    
-                    if is_net_error:
-                        # If filter matches network error, wait and retry
-                        self.update_activity() # Reset watchdog, we are alive and handling it
-                        self.status_update.emit("Network error. Retrying...")
-                        # Check cancel again before sleeping
-                        if self.isInterruptionRequested():
-                            break
-                        time.sleep(3)
-                        continue
-                    else:
-                        # Logic/Template error -> Skip note
-                        pass
-                    
-                    # Store internally if needed, but we aren't showing a summary anymore
+                self.update_activity()
+
+        self.update_activity()
+        self.progress_made.emit(index + 1)
+        return True
+
+    def drain(self, in_flight):
+        while in_flight:
+            if not self.commit_next(in_flight):
+                return False
+        return True
+
+    def run(self):
+        """
+        Staged pipeline:
+        prefetch/render (NotePrefetcher thread) -> requests (event loop, capped by the semaphore)
+        -> in-order apply/write (this thread, through the write buffer).
+        Every hand-off is bounded, so a slow stage holds back the ones before it.
+        """
+        runner = AsyncRunner.instance()
+        self.deck_names = DeckNameTable(mw.col, self.notes)
+        self.check_templates()
+        normalizer_start = NormalizerStats.snapshot()
+        prompt_cache_start = PromptCacheStats.snapshot()
+        # The semaphore caps requests on the wire; the window lets the next notes be fetched meanwhile
+        self.semaphore = runner.create_semaphore(self.concurrency)
+        window = self.concurrency * 2
+        if self.packing is not None:
+            # Each in-flight request carries a whole pack
+            window *= self.packing[0]
+        in_flight = deque() # (index, future, pack slot) in selection order
+
+        # Keep a full window of rendered notes ready so the request stage never waits on DB reads
+        prefetcher = NotePrefetcher(self.notes, self.prepare_note, window)
+        prefetcher.start()
+
+        try:
+            while True:
+                prepared = self.next_prepared(prefetcher)
+                if prepared is None:
                     break
+                i, (note, prompt, error) = prepared
+                self.update_activity()
+                # Check state before processing
+                if not self.wait_for_permission(in_flight):
+                    return
 
-            # If external loop was broken due to cancel
-            if self.isInterruptionRequested():
-                break
+                # Batch Processing Delay
+                # We want to pause BEFORE item i if i is a multiple of batch_size.
+                if self.batch_enabled and i > 0 and (i % self.batch_size == 0) and self.rate_limited:
+                    # The shared token bucket already paces requests; just show progress
+                    self.write_buffer.flush()
+
+                elif self.batch_enabled and i > 0 and (i % self.batch_size == 0):
+                    # Let the current batch land before the pause so the refresh shows all of it
+                    if not self.drain(in_flight):
+                        return
+                    # Saving the batch also signals the UI to refresh those browser rows so user sees progress
+                    self.write_buffer.flush()
+
+                    remaining = self.batch_delay
+
+                    if self.random_delay:
+                        extra = random.randint(self.random_min, self.random_max)
+                        self.status_update.emit(f"Adding random delay variance: +{extra}s")
+                        remaining += extra
+
+                    while remaining > 0:
+                        if self.isInterruptionRequested():
+                            return # Exit run immediately
+
+                        self.status_update.emit(f"Paused for batch limit... continuing in {remaining}s")
+                        time.sleep(1)
+                        remaining -= 1
+
+                    # Restore status text
+                    self.status_update.emit(f"Resuming processing...")
+
+                if error is not None:
+                    # Logic/Template error -> Skip note
+                    self.report_error(error)
+                    if note is not None:
+                        self.original_fields.pop(note.id, None)
+                    in_flight.append((i, None, None))
+                elif note is not None and self.packing is not None:
+                    self.add_to_pack(i, note, prompt, in_flight)
+                else:
+                    future = runner.submit(self.process_note_async(note, prompt)) if note is not None else None
+                    in_flight.append((i, future, None))
+
+                # Keep a bounded number of notes in flight
+                while len(in_flight) >= window:
+                    if not self.commit_next(in_flight):
+                        return
+
+            if not self.isInterruptionRequested():
+                self.drain(in_flight)
+        finally:
+            prefetcher.stop()
+            # Abandon whatever is still pending (cancel or restart)
+            for _, future, _ in in_flight:
+                if future is not None:
+                    future.cancel()
+            # Notes already counted as processed must reach the collection, even on cancel
+            self.write_buffer.flush()
+            # Snapshots of notes abandoned on cancel/restart
+            self.original_fields.clear()
+            self.report_normalizer_savings(normalizer_start)
+            self.report_prompt_sizes()
+            self.report_prompt_cache(prompt_cache_start)
 
-            self.progress_made.emit(i + 1)
+
+class EditorNoteWorker(QThread):
+    """
+    Requests one prompt's response for the note open in an editor. Only the prompt string crosses
+    to this thread; the editor's note is filled on the main thread when completed is emitted.
+    When streaming, partial text is emitted at most once per repaint interval so the editor isn't
+    reloaded per token.
+    """
+    text_received = pyqtSignal(str) # Accumulated text so far
+    completed = pyqtSignal(str)
+    failed = pyqtSignal(str)
+    status_update = pyqtSignal(str)
+
+    def __init__(self, prompt, response_format, config, stream=True):
+        super().__init__()
+        self.prompt = prompt
+        self.response_format = response_format
+        self.config = config
+        self.stream = stream
+        self.retry_policy = RetryPolicy.from_config(config)
+        self.repaint_interval = float(config.get("streaming", {}).get("repaintIntervalMs", 100)) / 1000.0
+
+    def run(self):
+        budget = self.retry_policy.new_budget()
+        while not self.isInterruptionRequested():
+            parts = []
+            last_emit = 0.0
+            try:
+                if not self.stream:
+                    response = send_prompt_to_llm(self.prompt, self.response_format, self.config)
+                    if not self.isInterruptionRequested():
+                        self.completed.emit(response)
+                    return
+                for text in stream_prompt_to_llm(self.prompt, self.response_format, self.config):
+                    if self.isInterruptionRequested():
+                        return
+                    parts.append(text)
+                    now = time.monotonic()
+                    if now - last_emit >= self.repaint_interval:
+                        self.text_received.emit("".join(parts))
+                        last_emit = now
+                self.completed.emit("".join(parts).strip())
+                return
+            except Exception as e:
+                # Only retry before anything was shown; a half-written field can't be rewound cleanly
+                delay = budget.next_delay(e) if not parts else None
+                if delay is None:
+                    self.failed.emit(str(e))
+                    return
+                self.status_update.emit(f"Retrying in {delay:.0f}s...")
+                # Short steps, so closing the editor doesn't wait out the backoff
+                deadline = time.monotonic() + delay
+                while time.monotonic() < deadline:
+                    if self.isInterruptionRequested():
+                        return
+                    time.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
 
 
 class ProgressDialog(QDialog):
     def __init__(self, parent=None):
         super(ProgressDialog, self).__init__(parent)
         self.worker = None
+        self.journal = None
         self.errors = []
         
         # Load timeout for Watchdog
-        settings = ConfigManager.load_settings()
-        self.net_timeout = float(settings.get("netTimeout", 10.0))
+        self.config = ConfigManager.get_snapshot()
+        # Only rows of changed notes are refreshed, at most once per interval
+        self.refresher = BrowserRefresher(self, parent if isinstance(parent, Browser) else None,
+                                          self.config.get("browserRefreshIntervalMs", 1000))
+        self.net_timeout = float(self.config.get("netTimeout", 10.0))
         self.watchdog_timer = None
         self.processed_count = 0 
+        self.dedupe_stats = (0, 0) # (prompts requested, answered by an identical earlier request)
         
         layout = QVBoxLayout()
 
@@ -256,17 +780,35 @@ class ProgressDialog(QDialog):
     def update_progress(self, value):
         self.processed_count = value # Track locally for restart logic
         self.progress_bar.setValue(value)
-        self.counter_label.setText(f"{value} of {self.progress_bar.maximum()} processed")
+        text = f"{value} of {self.progress_bar.maximum()} processed"
+        prompts, reused = self.dedupe_stats
+        if reused:
+            text += f" ({reused} duplicate prompts reused, {reused * 100 // prompts}% fewer requests)"
+        self.counter_label.setText(text)
+
+    def update_dedupe(self, prompts, reused):
+        self.dedupe_stats = (prompts, reused)
 
-    def run_task(self, notes, prompt_config):
+    def run_task(self, notes, prompt_config, job_name=None, journal=None):
         self.progress_bar.setMaximum(len(notes))
         self.progress_bar.setValue(0)
         self.errors = []
-        self.worker = MultipleNotesThreadWorker(notes, mw.col, prompt_config)  # pass the notes and prompt_config
+        self.dedupe_stats = (0, 0)
+
+        # Journal note-id selections (editor runs pass Note objects and aren't resumable)
+        self.journal = journal
+        if self.journal is None and notes and not isinstance(notes[0], Note):
+            try:
+                self.journal = JobJournal.create(mw.pm.name, notes, prompt_config, job_name)
+            except Exception as e:
+                print(f"[IntelliFiller] Could not create job journal: {e}")
+
+        self.worker = MultipleNotesThreadWorker(notes, mw.col, prompt_config, self.config, self.journal)  # pass the notes and prompt_config
         self.worker.progress_made.connect(self.update_progress)
         self.worker.status_update.connect(self.update_status)
         self.worker.deck_update.connect(self.update_deck_info)
         self.worker.refresh_browser.connect(self.on_refresh_browser)
+        self.worker.dedupe_update.connect(self.update_dedupe)
         self.worker.finished.connect(self.on_worker_finished)  # connect the finish signal to a slot
         
         # Start Watchdog
@@ -311,8 +853,18 @@ class ProgressDialog(QDialog):
             # Yield execution to others
             ExecutionManager.instance().yield_execution(self)
 
-    def on_refresh_browser(self):
-        mw.reset()
+    def on_refresh_browser(self, nids):
+        self.refresher.notes_changed(nids)
+
+    def refresh_after_run(self):
+        # The worker's last chunk may still be queued for the main thread; refresh once it is saved
+        CollectionWriter.instance().notify_when_written(self.finish_refresh)
+
+    def finish_refresh(self):
+        self.refresher.flush()
+        # Rebuilding the whole main window is slow on big collections; only on request
+        if self.config.get("fullResetOnFinish", False):
+            mw.reset()
 
     def copy_deck_path(self):
         text = self.deck_line_edit.text()
@@ -342,12 +894,9 @@ class ProgressDialog(QDialog):
     def on_worker_finished(self):
         self.update_progress(
             self.progress_bar.maximum())  # when the worker is finished, set the progress bar to maximum
+        self.close_journal()
         
-        # If we are in browser, reset
-        # If we are in editor single mode?
-        # mw.reset() is good for browser.
-        # For AddCards/EditCurrent, we might need to trigger a reload of the note in the editor?
-        mw.reset() 
+        self.refresh_after_run()
         ExecutionManager.instance().notify_finished(self)
         if self.watchdog_timer:
             self.watchdog_timer.stop()
@@ -398,9 +947,9 @@ class ProgressDialog(QDialog):
         
         self.update_status("Restarting...")
         
-        # Reload Watchdog Timeout setting to keep UI in sync
-        settings = ConfigManager.load_settings()
-        self.net_timeout = float(settings.get("netTimeout", 10.0))
+        # Reload settings (e.g. changed timeout) to keep UI and the new worker in sync
+        self.config = ConfigManager.get_snapshot()
+        self.net_timeout = float(self.config.get("netTimeout", 10.0))
         
         # 2. Prepare new worker
         progress_offset = self.processed_count
@@ -412,7 +961,7 @@ class ProgressDialog(QDialog):
             return
 
         # 3. Create new worker
-        new_worker = MultipleNotesThreadWorker(remaining_notes, mw.col, old_worker.prompt_config)
+        new_worker = MultipleNotesThreadWorker(remaining_notes, mw.col, old_worker.prompt_config, self.config, self.journal)
         
         self.worker = new_worker
         # Use default argument 'o=progress_offset' to capture the value at restart time
@@ -420,6 +969,9 @@ class ProgressDialog(QDialog):
         self.worker.status_update.connect(self.update_status)
         self.worker.deck_update.connect(self.update_deck_info)
         self.worker.refresh_browser.connect(self.on_refresh_browser)
+        # Keep counting on top of what the old worker already deduplicated
+        base = self.dedupe_stats
+        self.worker.dedupe_update.connect(lambda p, r, b=base: self.update_dedupe(b[0] + p, b[1] + r))
         self.worker.finished.connect(self.on_worker_finished)
         
         # Restart immediately (bypass queue as we already hold the token)
@@ -431,13 +983,20 @@ class ProgressDialog(QDialog):
         self.counter_label.setStyleSheet("")
         self.update_status("Connection restarted. Resuming...")
 
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
     def cancel(self):
         if self.worker:
             self.worker.requestInterruption()
             self.worker.wait(100) # Optional: give it a tiny moment to check flag
+        # Cancelled on purpose, so don't offer to resume it later
+        self.close_journal()
         
-        # Reset UI (e.g. Browser list) so partially processed changes are visible
-        mw.reset()
+        # Refresh UI (e.g. Browser list) so partially processed changes are visible
+        self.refresh_after_run()
         
         # Close immediately so the user isn't stuck
         # Close immediately so the user isn't stuck
@@ -451,41 +1010,12 @@ class ProgressDialog(QDialog):
 
 
 import json
-import re
 
-def parse_llm_json(response_text):
-    """
-    Parses JSON from LLM response, handling markdown code blocks.
-    Returns dict or None if parsing fails.
-    """
-    if not response_text:
-        return None
-        
-    # Remove markdown code blocks
-    # Pattern to match ```json ... ``` or just ``` ... ```
-    pattern = r"```(?:json)?\s*(.*?)\s*```"
-    match = re.search(pattern, response_text, re.DOTALL)
-    if match:
-        json_str = match.group(1)
-    else:
-        json_str = response_text
-        
-    try:
-        return json.loads(json_str)
-    except json.JSONDecodeError:
-        # Fallback: try to find start/end braces if there's extra text
-        start = json_str.find('{')
-        end = json_str.rfind('}')
-        if start != -1 and end != -1:
-             try:
-                 return json.loads(json_str[start:end+1])
-             except:
-                 pass
-        return None
-
-def apply_response_to_note(note_or_editor, prompt_config, response, is_editor=False):
+def apply_response_to_note(note_or_editor, prompt_config, response, is_editor=False, flush=True):
     """
     Applies the LLM response to the note (or editor) based on format.
+    With flush=False the note is only updated in memory and the caller is responsible for saving it;
+    otherwise it is written once after all mapped fields are filled.
     """
     fmt = prompt_config.get("responseFormat", "text")
     overwrite = prompt_config.get('overwriteField', False)
@@ -508,7 +1038,7 @@ def apply_response_to_note(note_or_editor, prompt_config, response, is_editor=Fa
                 if is_editor:
                     fill_field_for_note_in_editor(val, target_field, note_or_editor, overwrite)
                 else:
-                    fill_field_for_note_not_in_editor(val, note_or_editor, target_field, overwrite)
+                    fill_field_for_note_not_in_editor(val, note_or_editor, target_field, overwrite, flush=False)
             else:
                 # Key missing in response? Warning logic could go here.
                 pass
@@ -519,24 +1049,14 @@ def apply_response_to_note(note_or_editor, prompt_config, response, is_editor=Fa
         if is_editor:
             fill_field_for_note_in_editor(response, target_field, note_or_editor, overwrite)
         else:
-            fill_field_for_note_not_in_editor(response, note_or_editor, target_field, overwrite)
+            fill_field_for_note_not_in_editor(response, note_or_editor, target_field, overwrite, flush=False)
 
+    # One write per note, however many fields were filled
+    if flush and not is_editor and note_or_editor.id:
+        note_or_editor.flush()
 
-def enrich_without_editor(nid_or_note, prompt_config):
-    """generate"""
-    if isinstance(nid_or_note, Note):
-        note = nid_or_note
-    else:
-        note = mw.col.get_note(nid_or_note)
-        
-    prompt = create_prompt(note, prompt_config)
-    response = send_prompt_to_llm(prompt)
-    
-    # Delegate application logic
-    apply_response_to_note(note, prompt_config, response, is_editor=False)
 
-
-def process_notes(browser, prompt_config, pipeline_name=None):
+def process_notes(browser, prompt_config, pipeline_name=None, as_batch_job=False, only_changed=False):
     selected_notes = browser.selectedNotes()
     if not selected_notes:
         showWarning("No notes selected.")
@@ -544,7 +1064,7 @@ def process_notes(browser, prompt_config, pipeline_name=None):
 
     def on_save_completed():
         # Inject global overwrite setting into prompt_config(s)
-        settings = ConfigManager.load_settings()
+        settings = ConfigManager.get_snapshot()
         overwrite_global = settings.get('overwriteField', False)
         
         if isinstance(prompt_config, list):
@@ -560,9 +1080,26 @@ def process_notes(browser, prompt_config, pipeline_name=None):
         if item_name:
             update_history_config(item_name)
 
+        # Pre-flight skip rules: the job (and its progress total) only contains notes that need work
+        notes_to_process, skipped = filter_notes(mw.col, selected_notes, prompt_config)
+        if skipped:
+            tooltip(f"IntelliFiller: skipping {skipped} of {len(selected_notes)} notes that need no work.", parent=browser)
+        if only_changed and notes_to_process:
+            # Incremental re-fill: only notes whose inputs or template changed since their last fill
+            notes_to_process, unchanged = select_changed_notes(mw.col, mw.pm.name, notes_to_process, prompt_config)
+            if unchanged:
+                tooltip(f"IntelliFiller: skipping {unchanged} notes unchanged since their last fill.", parent=browser)
+        if not notes_to_process:
+            return
+
+        if as_batch_job and not isinstance(prompt_config, list):
+            # Offline provider batch: rendered and uploaded now, applied when the job finishes
+            BatchJobManager.instance().submit(notes_to_process, prompt_config, parent=browser)
+            return
+
         # Use Threaded Worker for ALL cases to prevent UI freezing
         progress_dialog = ProgressDialog(browser)
-        progress_dialog.run_task(selected_notes, prompt_config)
+        progress_dialog.run_task(notes_to_process, prompt_config, job_name=item_name)
 
     # If the editor is active and contains changes, save them first!
     if browser.editor:
@@ -579,18 +1116,124 @@ def process_single_note(editor, prompt_config):
     if not editor or not editor.note:
         return
 
-    def on_save_completed():
-        target_note = editor.note
-        
-        # We need a parent for the dialog. Use the window containing the editor.
-        parent_window = editor.parentWindow
-        
-        progress_dialog = ProgressDialog(parent_window)
-        # We pass a list containing the Note object itself to avoid DB fetch issues for AddCards
-        progress_dialog.run_task([target_note], prompt_config)
+    config = ConfigManager.get_snapshot()
+    prompt_config['overwriteField'] = config.get('overwriteField', False)
+
+    stream = config.get("streaming", {}).get("enabled", False)
+    # Save changes in editor to note first
+    editor.saveNow(lambda: run_single_note(editor, prompt_config, stream))
+
+
+# Editor workers that haven't finished yet; a QThread must outlive its run()
+_editor_workers = set()
+
+
+def stop_editor_run(editor):
+    """Interrupts the editor's running request, if any, and puts back the field it was previewing into."""
+    worker = getattr(editor, "intellifiller_editor_worker", None)
+    editor.intellifiller_editor_worker = None
+    if worker is None or not worker.isRunning():
+        return
+    worker.requestInterruption()
+    worker.discard_preview()
+    # Usually quick: the worker checks between chunks. If it is stuck in a read, _editor_workers keeps it alive
+    worker.wait(500)
+
+
+def run_single_note(editor, prompt_config, stream):
+    """
+    Fills the editor's note from a background request. The editor keeps its note: the prompt is
+    rendered here, and the response is applied on the main thread and shown with loadNoteKeepingFocus.
+    When streaming, text prompts show the answer in the field as it arrives; JSON prompts are only
+    applied once complete, since partial JSON can't be mapped to fields.
+    A new run in the same editor, or closing its window, stops the previous one.
+    """
+    stop_editor_run(editor)
+    note = editor.note
+    config = ConfigManager.get_snapshot()
+    fmt = prompt_config.get("responseFormat", "text")
+    target_field = prompt_config.get("targetField")
+    preview = stream and fmt != "json" and target_field in note
+    original = note[target_field] if preview else None
+
+    try:
+        prompt = create_prompt(note, prompt_config, config)
+    except Exception as e:
+        showWarning(str(e))
+        return
+
+    def show_partial(text):
+        if worker.isInterruptionRequested() or editor.note is not note:
+            return # Stopped, or the editor moved on to another note
+        note[target_field] = original
+        format_response_and_fill_field(text, note, target_field, prompt_config.get('overwriteField', False))
+        editor.loadNoteKeepingFocus()
+
+    def on_completed(response):
+        if worker.isInterruptionRequested() or editor.note is not note:
+            return
+        if preview:
+            note[target_field] = original
+        try:
+            apply_response_to_note(editor, prompt_config, response, is_editor=True)
+            # AddCards notes aren't in the collection yet; adding the card saves them
+            if note.id:
+                note.flush()
+        except Exception as e:
+            sys.stderr.write(f"IntelliFiller Error: {str(e)}")
+
+    def discard_preview():
+        if preview and editor.note is note and note[target_field] != original:
+            note[target_field] = original
+            editor.loadNoteKeepingFocus()
+
+    def on_failed(message):
+        if worker.isInterruptionRequested():
+            return
+        if preview and editor.note is note:
+            note[target_field] = original
+            editor.loadNoteKeepingFocus()
+        sys.stderr.write(f"IntelliFiller Error: {message}")
+
+    def on_finished():
+        _editor_workers.discard(worker)
+        if getattr(editor, "intellifiller_editor_worker", None) is worker:
+            editor.intellifiller_editor_worker = None
+
+    worker = EditorNoteWorker(prompt, fmt, config, stream)
+    worker.discard_preview = discard_preview
+    if preview:
+        worker.text_received.connect(show_partial)
+    worker.completed.connect(on_completed)
+    worker.failed.connect(on_failed)
+    worker.finished.connect(on_finished)
+    worker.status_update.connect(lambda text: tooltip(f"IntelliFiller: {text}", parent=editor.parentWindow))
+    # Keep a reference so the thread isn't garbage collected mid-request
+    _editor_workers.add(worker)
+    editor.intellifiller_editor_worker = worker
+    # Closing the Add/Edit window stops the run (the browser's editor lives as long as the browser)
+    window = editor.parentWindow
+    for signal in ("finished", "destroyed"):
+        if hasattr(window, signal):
+            getattr(window, signal).connect(worker.requestInterruption)
+    worker.start()
+    if not stream:
+        tooltip(f"IntelliFiller: running '{prompt_config.get('promptName', 'prompt')}'...", parent=window)
+
+
+def resume_job(journal):
+    """Restarts an interrupted bulk job with the notes its journal hasn't marked as written."""
+    remaining = journal.remaining_note_ids()
+    # Drop notes deleted since the crash
+    existing = set(mw.col.db.list(f"select id from notes where id in {ids2str(remaining)}"))
+    remaining = [nid for nid in remaining if nid in existing]
+    if not remaining:
+        journal.close()
+        tooltip(f"IntelliFiller: nothing left to do for '{journal.name}'.")
+        return
 
-    # 1. Save changes in editor to note
-    editor.saveNow(on_save_completed)
+    progress_dialog = ProgressDialog(mw)
+    progress_dialog.run_task(remaining, journal.prompt_config, job_name=journal.name, journal=journal)
 
 
 def update_history_config(item_name):
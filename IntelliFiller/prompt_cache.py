@@ -0,0 +1,67 @@
+import hashlib
+import threading
+
+from .token_estimator import get_estimator
+
+
+def get_prompt_parts(prompt, config):
+    """
+    Splits a rendered prompt into (static prefix, per-note suffix) when the prefix is long enough
+    for the provider to cache. Returns (None, prompt) when it isn't, or when caching is turned off.
+    """
+    prefix = getattr(prompt, "prefix", "")
+    caching = config.get("promptCaching", {})
+    if not prefix or len(prefix) >= len(prompt) or not caching.get("enabled", True):
+        return None, prompt
+    # Providers don't cache short prefixes (1024 tokens minimum on most models)
+    if get_estimator(config).estimate(prefix) < int(caching.get("minPrefixTokens", 1024)):
+        return None, prompt
+    return prefix, prompt[len(prefix):]
+
+
+def get_openai_cache_options(prompt, config):
+    """
+    Extra request options for OpenAI's automatic prefix caching. The prefix already leads the message,
+    so it stays byte-identical across notes; prompt_cache_key routes those requests to the same cache.
+    """
+    prefix, _ = get_prompt_parts(prompt, config)
+    if prefix is None:
+        return {}
+    return {"extra_body": {"prompt_cache_key": "intellifiller-" + hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16]}}
+
+
+class PromptCacheStats:
+    """Input tokens sent and served from provider prompt caches, as reported in response usage."""
+    lock = threading.Lock()
+    input_tokens = 0
+    cached_tokens = 0
+    cache_write_tokens = 0
+
+    @classmethod
+    def record(cls, input_tokens, cached_tokens, cache_write_tokens=0):
+        with cls.lock:
+            cls.input_tokens += input_tokens
+            cls.cached_tokens += cached_tokens
+            cls.cache_write_tokens += cache_write_tokens
+
+    @classmethod
+    def snapshot(cls):
+        with cls.lock:
+            return cls.input_tokens, cls.cached_tokens, cls.cache_write_tokens
+
+    @classmethod
+    def record_openai(cls, response):
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cls.record(getattr(usage, "prompt_tokens", 0) or 0, getattr(details, "cached_tokens", 0) or 0)
+
+    @classmethod
+    def record_anthropic(cls, usage):
+        if not usage:
+            return
+        # Anthropic reports cached and uncached input separately
+        read = usage.get("cache_read_input_tokens") or 0
+        written = usage.get("cache_creation_input_tokens") or 0
+        cls.record((usage.get("input_tokens") or 0) + read + written, read, written)
@@ -0,0 +1,144 @@
+import re
+from html import unescape
+
+from .field_normalizer import normalize_field, get_normalize_options
+
+# The one definition of a {{{Field}}} reference: what rendering substitutes is what skip rules,
+# pipeline dependencies and fill-state hashes treat as the prompt's inputs
+FIELD_REF_PATTERN = re.compile(r'\{\{\{(\w+)\}\}\}')
+TAG_PATTERN = re.compile('<.*?>')
+
+
+class RenderedPrompt(str):
+    """
+    A rendered prompt that remembers its static prefix: the template text before the first field
+    reference, identical for every note. Behaves as the full prompt string everywhere (cache keys,
+    estimates, dedupe); request code may send the prefix separately so the provider can cache it.
+    """
+    def __new__(cls, text, prefix):
+        prompt = super().__new__(cls, text)
+        prompt.prefix = prefix
+        return prompt
+
+
+class PromptTemplate:
+    """
+    A prompt split once into literal text and {{{Field}}} references.
+    References are resolved to field ordinals once per notetype (a render plan), so rendering a note
+    is a single join over note.fields.
+    With normalize options, field values go through the cached normalizer and the literal text is
+    cleaned at compile time; otherwise the joined prompt is unescaped and tag-stripped as a whole.
+    """
+    def __init__(self, text, normalize=None):
+        self.text = text
+        self.normalize = normalize # (strip_media, unwrap_cloze) or None
+        self.literals = [] # Literal text before each reference, plus the tail
+        self.field_names = [] # Referenced field per slot, in template order
+        pos = 0
+        for match in FIELD_REF_PATTERN.finditer(text):
+            self.literals.append(text[pos:match.start()])
+            self.field_names.append(match.group(1))
+            pos = match.end()
+        self.literals.append(text[pos:])
+        if normalize is not None:
+            self.literals = [TAG_PATTERN.sub('', unescape(literal)) for literal in self.literals]
+        # Static prefix as it appears in the rendered prompt (none if the template starts with a field)
+        self.prefix = self.literals[0] if self.field_names else ""
+        if normalize is None:
+            self.prefix = TAG_PATTERN.sub('', unescape(self.prefix))
+        self.plans = {} # mid -> (notetype mod, plan or None, error message or None)
+
+    def plan_for(self, notetype):
+        """
+        Compiles the render plan for a notetype: the segment list with a placeholder per reference
+        and (segment position, field ordinal) pairs to fill in. Cached until the notetype changes.
+        Returns (plan, error); error is a message naming the fields the notetype lacks. Only the message is
+        cached: a cached exception raised for every note would collect each raise's traceback frames.
+        """
+        mid, mod = notetype['id'], notetype.get('mod')
+        cached = self.plans.get(mid)
+        if cached is not None and cached[0] == mod:
+            return cached[1], cached[2]
+
+        ordinals = {field['name']: field['ord'] for field in notetype['flds']}
+        missing = list(dict.fromkeys(name for name in self.field_names if name not in ordinals))
+        if missing:
+            names = ", ".join(f"'{name}'" for name in missing)
+            plan, error = None, f"Field {names} not found in note type '{notetype.get('name', mid)}'."
+        else:
+            segments = []
+            slots = []
+            for literal, name in zip(self.literals, self.field_names):
+                segments.append(literal)
+                slots.append((len(segments), ordinals[name]))
+                segments.append("")
+            segments.append(self.literals[-1])
+            plan, error = (segments, slots), None
+
+        self.plans[mid] = (mod, plan, error)
+        return plan, error
+
+    def render(self, note, budget=None):
+        """Renders the note's prompt; budget is an optional InputBudget the prompt must fit into."""
+        plan, error = self.plan_for(note.note_type())
+        if error is not None:
+            raise ValueError(error)
+        fields = note.fields
+        values = [fields[ordinal] for _, ordinal in plan[1]]
+        if self.normalize is not None:
+            values = [normalize_field(value, self.normalize) for value in values]
+        prompt = self.join(plan, values)
+        if budget is not None:
+            prompt = budget.apply(prompt, values, lambda shortened: self.join(plan, shortened))
+        # Without normalization a tag could straddle the prefix boundary; only keep a prefix that survived intact
+        if self.prefix and prompt.startswith(self.prefix):
+            return RenderedPrompt(prompt, self.prefix)
+        return prompt
+
+    def join(self, plan, values):
+        segments, slots = plan
+        segments = list(segments)
+        for (position, _), value in zip(slots, values):
+            segments[position] = value
+        prompt = "".join(segments)
+        if self.normalize is not None:
+            return prompt
+        # unescape HTML entities and remove HTML tags
+        return TAG_PATTERN.sub('', unescape(prompt))
+
+
+_templates = {}
+
+
+def get_template(prompt_config):
+    """Returns the compiled template for a prompt, compiling it on first use."""
+    key = (prompt_config['prompt'], get_normalize_options(prompt_config))
+    template = _templates.get(key)
+    if template is None:
+        if len(_templates) > 64:
+            # Edited prompts leave old versions behind; start over rather than grow forever
+            _templates.clear()
+        template = _templates[key] = PromptTemplate(*key)
+    return template
+
+
+def check_templates(col, note_ids, prompt_configs):
+    """
+    Compiles each prompt against every notetype in the selection up front.
+    Returns a list of (prompt name, notetype name, note count, error) for references that can't be resolved.
+    """
+    from anki.utils import ids2str
+
+    if not note_ids:
+        return []
+    problems = []
+    counts = col.db.all(f"select mid, count() from notes where id in {ids2str(note_ids)} group by mid")
+    for mid, count in counts:
+        notetype = col.models.get(mid)
+        if notetype is None:
+            continue
+        for prompt_config in prompt_configs:
+            _, error = get_template(prompt_config).plan_for(notetype)
+            if error is not None:
+                problems.append((prompt_config.get('promptName', ''), notetype['name'], count, error))
+    return problems
@@ -0,0 +1,82 @@
+import email.utils
+import time
+
+import httpx
+import openai
+
+# Statuses worth retrying: timeouts, conflicts, rate limits, server errors (529 = Anthropic overloaded)
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+
+class ProviderError(Exception):
+    """
+    Error raised while calling an LLM provider.
+    Carries the HTTP status (None for transport errors), the server's Retry-After hint
+    in seconds, and whether the request is worth retrying.
+    """
+    def __init__(self, message, status=None, retry_after=None, retryable=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        if retryable is None:
+            retryable = status in RETRYABLE_STATUSES
+        self.retryable = retryable
+
+
+def parse_retry_after(headers):
+    """Returns the server backoff hint in seconds (Retry-After / retry-after-ms), or None."""
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000.0)
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # HTTP-date form
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(0.0, parsed.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def to_provider_error(provider_label, e):
+    """Converts httpx/openai exceptions into a ProviderError; other exceptions are returned unchanged."""
+    if isinstance(e, ProviderError):
+        return e
+
+    prefix = f"Error calling {provider_label} API"
+
+    if isinstance(e, httpx.HTTPStatusError):
+        response = e.response
+        body = response.text[:300] if response is not None else ""
+        return ProviderError(
+            f"{prefix}: HTTP {response.status_code} {body}",
+            status=response.status_code,
+            retry_after=parse_retry_after(response.headers)
+        )
+    if isinstance(e, httpx.TransportError):
+        # Timeouts, refused/reset connections, proxy failures
+        return ProviderError(f"{prefix}: {type(e).__name__}: {str(e)}", retryable=True)
+
+    if isinstance(e, openai.APIStatusError):
+        return ProviderError(
+            f"{prefix}: HTTP {e.status_code} {e.message}",
+            status=e.status_code,
+            retry_after=parse_retry_after(e.response.headers)
+        )
+    if isinstance(e, openai.APIConnectionError):
+        # Includes APITimeoutError
+        return ProviderError(f"{prefix}: {type(e).__name__}: {str(e)}", retryable=True)
+
+    return e
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Classic token bucket. reserve() takes tokens immediately (the balance may go negative)
+    and returns how long the caller must wait, so concurrent callers queue up fairly.
+    """
+    def __init__(self, per_minute):
+        self.lock = threading.Lock()
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.configure(per_minute)
+        self.tokens = self.capacity
+
+    def configure(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0  # tokens per second
+
+    def reserve(self, amount):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # A single request larger than the whole budget can never fit; let it drain the bucket instead
+            self.tokens -= min(float(amount), self.capacity)
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budget for one provider.
+    A limit of 0 means unlimited. Instances are shared by all jobs via ExecutionManager.
+    """
+    def __init__(self, rpm=0, tpm=0):
+        self.rpm = None
+        self.tpm = None
+        self.requests = None
+        self.tokens = None
+        self.configure(rpm, tpm)
+
+    def configure(self, rpm, tpm):
+        rpm, tpm = int(rpm or 0), int(tpm or 0)
+        if rpm != self.rpm:
+            self.requests = TokenBucket(rpm) if rpm > 0 else None
+            self.rpm = rpm
+        if tpm != self.tpm:
+            self.tokens = TokenBucket(tpm) if tpm > 0 else None
+            self.tpm = tpm
+
+    @property
+    def enabled(self):
+        return self.requests is not None or self.tokens is not None
+
+    def reserve(self, tokens):
+        """Books one request of the given size and returns the required wait in seconds."""
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def acquire(self, tokens):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
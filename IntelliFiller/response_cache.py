@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+
+class ResponseCache:
+    """
+    Persistent LLM response cache stored in user_files/cache/responses.sqlite3.
+    Entries are keyed by provider, model, response format and the rendered prompt,
+    expire after a TTL and are evicted least-recently-used once the size limits are hit.
+    Identical requests that are already in flight are coalesced into a single call.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    # Eviction scans the table, so only run it every N writes
+    EVICT_EVERY = 50
+
+    @classmethod
+    def instance(cls, cache_dir):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls(os.path.join(cache_dir, "responses.sqlite3"))
+        return cls._instance
+
+    def __init__(self, path, ttl_days=30, max_entries=50000, max_size_mb=100):
+        self.path = path
+        self.configure(ttl_days, max_entries, max_size_mb)
+        self.db_lock = threading.Lock()
+        self._pending = {}        # key -> concurrent.futures.Future (sync callers)
+        self._pending_async = {}  # key -> asyncio.Future (event loop callers)
+        self._writes = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL,"
+            " size INTEGER NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed)")
+        self.evict()
+
+    def configure(self, ttl_days, max_entries, max_size_mb):
+        self.ttl = float(ttl_days) * 86400
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(float(max_size_mb) * 1024 * 1024)
+
+    @staticmethod
+    def make_key(provider, model, response_format, prompt):
+        payload = json.dumps([provider, model, response_format, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.db_lock:
+            row = self.db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self.db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        with self.db_lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, response, now, now, len(response.encode("utf-8")))
+            )
+            self._writes += 1
+            should_evict = self._writes % self.EVICT_EVERY == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Drops expired entries, then the least recently used ones until both limits hold."""
+        with self.db_lock:
+            self.db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+            count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if count <= self.max_entries and total <= self.max_bytes:
+                return
+
+            to_delete = []
+            for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                if count <= self.max_entries and total <= self.max_bytes:
+                    break
+                to_delete.append((key,))
+                count -= 1
+                total -= size
+            self.db.executemany("DELETE FROM responses WHERE key = ?", to_delete)
+
+    def clear(self):
+        with self.db_lock:
+            self.db.execute("DELETE FROM responses")
+            self.db.execute("VACUUM")
+
+    def fetch(self, key, producer, validate=None):
+        """
+        Returns the cached response or calls producer() once, even if several threads ask at once.
+        Responses rejected by validate(response) are returned but not stored.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self.db_lock:
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._pending[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            response = producer()
+            if validate is None or validate(response):
+                self.put(key, response)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.db_lock:
+                self._pending.pop(key, None)
+
+    async def fetch_async(self, key, producer, validate=None):
+        """
+        Async counterpart of fetch; producer is a zero-argument coroutine function.
+        Database access runs in the loop's executor: it shares db_lock with sync callers and
+        Clear Cache, and must not stall the other requests on the loop while it waits.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            cached = await loop.run_in_executor(None, self.get, key)
+            if cached is not None:
+                return cached
+
+            future = self._pending_async.get(key)
+            if future is None:
+                break
+            try:
+                # shield: a cancelled follower must not cancel the shared request
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The request we were waiting on was abandoned; try again ourselves
+
+        future = loop.create_future()
+        self._pending_async[key] = future
+        try:
+            response = await producer()
+        except asyncio.CancelledError:
+            future.cancel()
+            self._pending_async.pop(key, None)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be waiting on it; avoid "exception was never retrieved" noise
+            future.exception()
+            self._pending_async.pop(key, None)
+            raise
+
+        # Resolve followers first; the entry stays until the response is stored so a caller
+        # whose lookup ran before the write still finds it here instead of asking again
+        future.set_result(response)
+        try:
+            if validate is None or validate(response):
+                await loop.run_in_executor(None, self.put, key, response)
+        finally:
+            self._pending_async.pop(key, None)
+        return response
@@ -0,0 +1,52 @@
+import random
+
+from .provider_errors import ProviderError
+
+
+class RetryPolicy:
+    """
+    Capped exponential backoff with full jitter.
+    Only ProviderErrors marked retryable are retried; a server Retry-After hint wins over the backoff.
+    """
+    def __init__(self, max_retries=5, base_delay=1.0, max_delay=60.0, max_retry_after=300.0):
+        self.max_retries = int(max_retries)
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.max_retry_after = float(max_retry_after)
+
+    @classmethod
+    def from_config(cls, config):
+        retry_cfg = config.get("retry", {})
+        return cls(
+            max_retries=retry_cfg.get("maxRetries", 5),
+            base_delay=retry_cfg.get("baseDelay", 1.0),
+            max_delay=retry_cfg.get("maxDelay", 60.0)
+        )
+
+    @staticmethod
+    def is_retryable(error):
+        return isinstance(error, ProviderError) and error.retryable
+
+    def get_delay(self, attempt, error):
+        if isinstance(error, ProviderError) and error.retry_after is not None:
+            # Honor the server hint, plus a little jitter so parallel requests don't return in lockstep
+            return min(error.retry_after, self.max_retry_after) + random.uniform(0, 1.0)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def new_budget(self):
+        return RetryBudget(self)
+
+
+class RetryBudget:
+    """Retry allowance shared by all requests made for one note."""
+    def __init__(self, policy):
+        self.policy = policy
+        self.attempts = 0
+
+    def next_delay(self, error):
+        """Returns the seconds to wait before retrying, or None if the note should fail now."""
+        if not self.policy.is_retryable(error) or self.attempts >= self.policy.max_retries:
+            return None
+        delay = self.policy.get_delay(self.attempts, error)
+        self.attempts += 1
+        return delay
@@ -4,6 +4,9 @@ from aqt.qt import QDialog, QVBoxLayout, QLabel, QPushButton, QTextEdit, QComboB
 from aqt import mw
 from aqt.utils import showWarning
 
+from .config_manager import ConfigManager
+from .batch_jobs import supports_batch_jobs
+
 
 class RunPromptDialog(QDialog):
     def __init__(self, parentWindow, possible_fields, prompt_config):
@@ -41,6 +44,16 @@ class RunPromptDialog(QDialog):
         self.save_changes_checkbox = QCheckBox("Save changes to prompt configuration")
         layout.addWidget(self.save_changes_checkbox)
 
+        # Offline batch job (OpenAI / Anthropic only): cheaper, results arrive later
+        self.batch_job_checkbox = QCheckBox("Submit as batch job (cheaper, results within 24h)")
+        self.batch_job_checkbox.setEnabled(supports_batch_jobs(ConfigManager.get_snapshot()))
+        layout.addWidget(self.batch_job_checkbox)
+
+        # Incremental re-fill based on the fill-state index
+        self.only_changed_checkbox = QCheckBox("Only notes changed since their last fill")
+        self.only_changed_checkbox.setToolTip("Skip notes whose prompt fields and template are the same as when this prompt last filled them.")
+        layout.addWidget(self.only_changed_checkbox)
+
         run_button = QPushButton("Run")
         run_button.clicked.connect(self.try_to_accept)
         # Make it the default button and give it focus
@@ -65,7 +78,9 @@ class RunPromptDialog(QDialog):
         # Include save flag in result
         self.result = {
             "config": self.prompt_config,
-            "save": self.save_changes_checkbox.isChecked()
+            "save": self.save_changes_checkbox.isChecked(),
+            "batch": self.batch_job_checkbox.isChecked(),
+            "onlyChanged": self.only_changed_checkbox.isChecked()
         }
         self.accept()
 
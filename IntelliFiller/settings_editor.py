@@ -6,6 +6,7 @@ from aqt.utils import showInfo
 from .settings_window_ui import Ui_SettingsWindow
 from .config_manager import ConfigManager
 from .backup_manager import BackupManager
+from .response_cache import ResponseCache
 import json
 import os
 
@@ -44,6 +45,7 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
         
 
         self.backupNowBtn.clicked.connect(self.trigger_manual_backup)
+        self.clearResponseCacheBtn.clicked.connect(self.clear_response_cache)
         
         # Connect API selection to stacked widget page
         self.selectedApi.currentIndexChanged.connect(self.stackedWidget.setCurrentIndex)
@@ -138,8 +140,11 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
         self.emulate.setCurrentText(config.get("emulate", "no"))
         self.overwriteField.setChecked(config.get("overwriteField", False))
         self.flatMenu.setChecked(config.get("flatMenu", False))
+        self.fullResetOnFinish.setChecked(config.get("fullResetOnFinish", False))
         self.maxFavorites.setValue(config.get("maxFavorites", 3))
         self.netTimeout.setValue(config.get("netTimeout", 10))
+        self.http2.setChecked(config.get("http2", False))
+        self.responseCacheEnabled.setChecked(config.get("responseCache", {}).get("enabled", True))
         # Default to True (Security by Default)
         self.obfuscateCreds.setChecked(config.get("obfuscateCreds", True))
         self.encryptionKey.setText(config.get("encryptionKey", ""))
@@ -152,6 +157,7 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
         self.batchRandom.setChecked(batch_config.get("randomDelay", True))
         self.randomDelayMin.setValue(batch_config.get("randomDelayMin", 0))
         self.randomDelayMax.setValue(batch_config.get("randomDelayMax", 10))
+        self.concurrency.setValue(batch_config.get("concurrency", 1))
         
         # Connect additional signal for batchRandom toggle
         self.batchRandom.toggled.connect(self.update_random_ui_state)
@@ -178,6 +184,11 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
         self.promptName.textChanged.connect(self.update_current_prompt_name)
         self.promptPinnedCheckbox.clicked.connect(self.update_current_prompt_pinned)
         self.promptResponseFormat.currentTextChanged.connect(self.update_current_prompt_format)
+        self.promptPackingMaxNotes.valueChanged.connect(self.update_current_prompt_packing)
+        self.promptSkipTargetFilled.clicked.connect(self.update_current_prompt_skip)
+        self.promptSkipSourceEmpty.clicked.connect(self.update_current_prompt_skip)
+        self.promptSkipTags.textChanged.connect(self.update_current_prompt_skip)
+        self.promptNormalizeCheckbox.clicked.connect(self.update_current_prompt_normalize)
         self.promptTargetField.textChanged.connect(self.update_current_prompt_target)
         self.promptFieldMapping.textChanged.connect(self.update_current_prompt_mapping)
         self.promptText.textChanged.connect(self.update_current_prompt_text)
@@ -299,6 +310,8 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
         self.promptName.blockSignals(True)
         self.promptPinnedCheckbox.blockSignals(True)
         self.promptResponseFormat.blockSignals(True)
+        self.promptPackingMaxNotes.blockSignals(True)
+        self.promptSkipTags.blockSignals(True)
         self.promptTargetField.blockSignals(True)
         self.promptFieldMapping.blockSignals(True)
         self.promptText.blockSignals(True)
@@ -308,6 +321,11 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
             self.promptName.clear()
             self.promptPinnedCheckbox.setChecked(False)
             self.promptResponseFormat.setCurrentIndex(0) # Text
+            self.promptPackingMaxNotes.setValue(1)
+            self.promptSkipTargetFilled.setChecked(False)
+            self.promptSkipSourceEmpty.setChecked(False)
+            self.promptSkipTags.clear()
+            self.promptNormalizeCheckbox.setChecked(False)
             self.promptTargetField.clear()
             self.promptFieldMapping.clear()
             self.promptText.clear()
@@ -322,6 +340,16 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
             self.promptResponseFormat.setCurrentText("JSON" if fmt == "json" else "Text")
             self.update_prompt_ui_visibility(fmt)
 
+            packing = prompt.get("packing", {})
+            self.promptPackingMaxNotes.setValue(packing.get("maxNotes", 1) if packing.get("enabled", False) else 1)
+
+            skip = prompt.get("skip", {})
+            self.promptSkipTargetFilled.setChecked(skip.get("targetFilled", False))
+            self.promptSkipSourceEmpty.setChecked(skip.get("sourceEmpty", False))
+            self.promptSkipTags.setText(" ".join(skip.get("tags", [])))
+
+            self.promptNormalizeCheckbox.setChecked(prompt.get("normalize", {}).get("enabled", False))
+
             self.promptTargetField.setText(prompt.get("targetField", ""))
             
             mapping = prompt.get("fieldMapping", {})
@@ -335,6 +363,8 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
         self.promptName.blockSignals(False)
         self.promptPinnedCheckbox.blockSignals(False)
         self.promptResponseFormat.blockSignals(False)
+        self.promptPackingMaxNotes.blockSignals(False)
+        self.promptSkipTags.blockSignals(False)
         self.promptTargetField.blockSignals(False)
         self.promptFieldMapping.blockSignals(False)
         self.promptText.blockSignals(False)
@@ -353,7 +383,8 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
             "targetField": "",
             "pinned": False,
             "responseFormat": "text",
-            "fieldMapping": {}
+            "fieldMapping": {},
+            "normalize": {"enabled": True}
         }
         self.prompts.append(new_prompt)
         self.refresh_prompts_list()
@@ -385,6 +416,32 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
             self.prompts[row]["responseFormat"] = fmt
             self.update_prompt_ui_visibility(fmt)
 
+    def update_current_prompt_packing(self, value):
+        row = self.promptsList.currentRow()
+        if row >= 0:
+            # Keep any hand-edited token budget
+            packing = dict(self.prompts[row].get("packing", {}))
+            packing["enabled"] = value > 1
+            packing["maxNotes"] = value
+            self.prompts[row]["packing"] = packing
+
+    def update_current_prompt_skip(self):
+        row = self.promptsList.currentRow()
+        if row >= 0:
+            self.prompts[row]["skip"] = {
+                "targetFilled": self.promptSkipTargetFilled.isChecked(),
+                "sourceEmpty": self.promptSkipSourceEmpty.isChecked(),
+                "tags": self.promptSkipTags.text().split()
+            }
+
+    def update_current_prompt_normalize(self):
+        row = self.promptsList.currentRow()
+        if row >= 0:
+            # Keep hand-edited stripMedia/unwrapCloze options
+            normalize = dict(self.prompts[row].get("normalize", {}))
+            normalize["enabled"] = self.promptNormalizeCheckbox.isChecked()
+            self.prompts[row]["normalize"] = normalize
+
     def update_current_prompt_target(self, text):
         row = self.promptsList.currentRow()
         if row >= 0:
@@ -494,18 +551,25 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
         config["emulate"] = self.emulate.currentText()
         config["overwriteField"] = self.overwriteField.isChecked()
         config["flatMenu"] = self.flatMenu.isChecked()
+        config["fullResetOnFinish"] = self.fullResetOnFinish.isChecked()
         config["maxFavorites"] = self.maxFavorites.value()
         config["netTimeout"] = self.netTimeout.value()
+        config["http2"] = self.http2.isChecked()
+        # Keep size/TTL limits that are only editable in JSON
+        config["responseCache"] = {**config.get("responseCache", {}), "enabled": self.responseCacheEnabled.isChecked()}
         config["obfuscateCreds"] = self.obfuscateCreds.isChecked()
         config["encryptionKey"] = self.encryptionKey.text()
         
         config["batchProcessing"] = {
+            # Keep settings without a UI control (e.g. writeChunkSize)
+            **config.get("batchProcessing", {}),
             "enabled": self.batchEnabled.isChecked(),
             "batchSize": self.batchSize.value(),
             "batchDelay": self.batchDelay.value(),
             "randomDelay": self.batchRandom.isChecked(),
             "randomDelayMin": self.randomDelayMin.value(),
-            "randomDelayMax": self.randomDelayMax.value()
+            "randomDelayMax": self.randomDelayMax.value(),
+            "concurrency": self.concurrency.value()
         }
         
         config["prompts"] = self.prompts
@@ -554,6 +618,13 @@ class SettingsWindow(QDialog, Ui_SettingsWindow):
         except Exception as e:
             showInfo(f"Backup failed: {str(e)}")
 
+    def clear_response_cache(self):
+        try:
+            ResponseCache.instance(ConfigManager.CACHE_DIR).clear()
+            showInfo("Response cache cleared.")
+        except Exception as e:
+            showInfo(f"Failed to clear cache: {str(e)}")
+
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_S and (event.modifiers() & Qt.KeyboardModifier.ControlModifier):
             self._save_settings_logic()
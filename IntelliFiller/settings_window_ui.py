@@ -111,6 +111,10 @@ class Ui_SettingsWindow(object):
         self.flatMenuLabel = QtWidgets.QLabel(self.tabApi)
         self.flatMenu = QtWidgets.QCheckBox(self.tabApi)
         self.emulationLayout.addRow(self.flatMenuLabel, self.flatMenu)
+
+        self.fullResetOnFinishLabel = QtWidgets.QLabel(self.tabApi)
+        self.fullResetOnFinish = QtWidgets.QCheckBox(self.tabApi)
+        self.emulationLayout.addRow(self.fullResetOnFinishLabel, self.fullResetOnFinish)
         
         self.labelMaxFavorites = QtWidgets.QLabel(self.tabApi)
         self.maxFavorites = QtWidgets.QSpinBox(self.tabApi)
@@ -132,6 +136,19 @@ class Ui_SettingsWindow(object):
         self.netTimeout.setRange(5, 300)
         self.netTimeout.setSuffix(" sec")
         self.emulationLayout.addRow(self.labelNetTimeout, self.netTimeout)
+
+        self.labelHttp2 = QtWidgets.QLabel(self.tabApi)
+        self.http2 = QtWidgets.QCheckBox(self.tabApi)
+        self.emulationLayout.addRow(self.labelHttp2, self.http2)
+
+        self.labelResponseCache = QtWidgets.QLabel(self.tabApi)
+        self.responseCacheLayout = QtWidgets.QHBoxLayout()
+        self.responseCacheEnabled = QtWidgets.QCheckBox(self.tabApi)
+        self.clearResponseCacheBtn = QtWidgets.QPushButton(self.tabApi)
+        self.responseCacheLayout.addWidget(self.responseCacheEnabled)
+        self.responseCacheLayout.addWidget(self.clearResponseCacheBtn)
+        self.responseCacheLayout.addStretch()
+        self.emulationLayout.addRow(self.labelResponseCache, self.responseCacheLayout)
         
         self.tabApiLayout.addLayout(self.emulationLayout)
         
@@ -162,6 +179,10 @@ class Ui_SettingsWindow(object):
         self.randomDelayMax.setRange(0, 3600)
         self.randomDelayMax.setSuffix(" sec")
         self.batchLayout.addRow(QtWidgets.QLabel("Max Random Delay:", self.batchGroup), self.randomDelayMax)
+
+        self.concurrency = QtWidgets.QSpinBox(self.batchGroup)
+        self.concurrency.setRange(1, 64)
+        self.batchLayout.addRow(QtWidgets.QLabel("Parallel Requests:", self.batchGroup), self.concurrency)
         
         self.tabApiLayout.addWidget(self.batchGroup)
         
@@ -210,6 +231,12 @@ class Ui_SettingsWindow(object):
         self.promptResponseFormat.addItems(["Text", "JSON"])
         self.promptFormatLayout.addWidget(self.labelPromptFormat)
         self.promptFormatLayout.addWidget(self.promptResponseFormat)
+        # Multi-note packing: several notes answered by one request (1 = off)
+        self.labelPromptPacking = QtWidgets.QLabel("Notes per Request:", self.promptDetailsGroup)
+        self.promptPackingMaxNotes = QtWidgets.QSpinBox(self.promptDetailsGroup)
+        self.promptPackingMaxNotes.setRange(1, 100)
+        self.promptFormatLayout.addWidget(self.labelPromptPacking)
+        self.promptFormatLayout.addWidget(self.promptPackingMaxNotes)
         self.promptFormatLayout.addStretch()
         self.promptDetailsLayout.addLayout(self.promptFormatLayout)
 
@@ -221,6 +248,22 @@ class Ui_SettingsWindow(object):
         self.promptTargetLayout.addWidget(self.promptTargetField)
         self.promptDetailsLayout.addLayout(self.promptTargetLayout)
 
+        # Skip rules, checked before a bulk run starts
+        self.promptSkipLayout = QtWidgets.QHBoxLayout()
+        self.promptSkipTargetFilled = QtWidgets.QCheckBox("Skip if target filled", self.promptDetailsGroup)
+        self.promptSkipSourceEmpty = QtWidgets.QCheckBox("Skip if source empty", self.promptDetailsGroup)
+        self.labelPromptSkipTags = QtWidgets.QLabel("Skip tags:", self.promptDetailsGroup)
+        self.promptSkipTags = QtWidgets.QLineEdit(self.promptDetailsGroup)
+        self.promptSkipLayout.addWidget(self.promptSkipTargetFilled)
+        self.promptSkipLayout.addWidget(self.promptSkipSourceEmpty)
+        self.promptSkipLayout.addWidget(self.labelPromptSkipTags)
+        self.promptSkipLayout.addWidget(self.promptSkipTags)
+        self.promptDetailsLayout.addLayout(self.promptSkipLayout)
+
+        # Field cleanup before fields are inserted into the prompt
+        self.promptNormalizeCheckbox = QtWidgets.QCheckBox("Clean field content", self.promptDetailsGroup)
+        self.promptDetailsLayout.addWidget(self.promptNormalizeCheckbox)
+
         # Field Mapping (JSON Mode)
         self.labelPromptMapping = QtWidgets.QLabel("JSON Mapping (Key: Field Name):", self.promptDetailsGroup)
         self.promptDetailsLayout.addWidget(self.labelPromptMapping)
@@ -421,6 +464,8 @@ class Ui_SettingsWindow(object):
         self.flatMenuLabel.setText(_translate("SettingsWindow", "Show in Root Menu:"))
         self.flatMenu.setText(_translate("SettingsWindow", ""))
         self.flatMenu.setToolTip(_translate("SettingsWindow", "If checked, removes the 'IntelliFiller' submenu and shows items directly in the main context menu."))
+        self.fullResetOnFinishLabel.setText(_translate("SettingsWindow", "Full Refresh After Runs:"))
+        self.fullResetOnFinish.setToolTip(_translate("SettingsWindow", "Reset the whole main window when a run ends or is cancelled. Otherwise only the changed browser rows are refreshed, which is much faster on large collections."))
         self.labelMaxFavorites.setText(_translate("SettingsWindow", "Max Smart Menu Items:"))
         self.labelObfuscate.setText(_translate("SettingsWindow", "Obfuscate Credentials File:"))
         self.obfuscateCreds.setText(_translate("SettingsWindow", ""))
@@ -433,6 +478,11 @@ class Ui_SettingsWindow(object):
         
         self.labelNetTimeout.setText(_translate("SettingsWindow", "Network Timeout:"))
         self.netTimeout.setToolTip(_translate("SettingsWindow", "Time in seconds to wait for an API response before giving up."))
+        self.labelHttp2.setText(_translate("SettingsWindow", "Use HTTP/2:"))
+        self.labelResponseCache.setText(_translate("SettingsWindow", "Cache Responses:"))
+        self.responseCacheEnabled.setToolTip(_translate("SettingsWindow", "Reuse stored answers for prompts that were already sent with the same provider and model."))
+        self.clearResponseCacheBtn.setText(_translate("SettingsWindow", "Clear Cache"))
+        self.http2.setToolTip(_translate("SettingsWindow", "Multiplex requests over a single connection. Requires the 'h2' package in the vendor folder; ignored otherwise."))
         
         self.batchGroup.setTitle(_translate("SettingsWindow", "Batch Processing"))
         self.batchEnabled.setText(_translate("SettingsWindow", ""))
@@ -443,6 +493,7 @@ class Ui_SettingsWindow(object):
         self.batchRandom.setToolTip(_translate("SettingsWindow", "Adds a random delay after the batch pause to disperse requests."))
         self.randomDelayMin.setToolTip(_translate("SettingsWindow", "Minimum additional random delay in seconds."))
         self.randomDelayMax.setToolTip(_translate("SettingsWindow", "Maximum additional random delay in seconds."))
+        self.concurrency.setToolTip(_translate("SettingsWindow", "Number of notes sent to the API at the same time. Results are still written in selection order."))
         
         self.backupNowBtn.setText(_translate("SettingsWindow", "Backup Now"))
         
@@ -456,7 +507,17 @@ class Ui_SettingsWindow(object):
         self.promptName.setPlaceholderText(_translate("SettingsWindow", "Prompt Name"))
         self.promptPinnedCheckbox.setText(_translate("SettingsWindow", "Pin to Context Menu"))
         self.labelPromptFormat.setText(_translate("SettingsWindow", "Response Format:"))
+        self.labelPromptPacking.setText(_translate("SettingsWindow", "Notes per Request:"))
+        self.promptPackingMaxNotes.setToolTip(_translate("SettingsWindow", "Pack several notes into one request during bulk runs. 1 sends one request per note."))
         self.labelPromptTarget.setText(_translate("SettingsWindow", "Target Field:"))
+        self.promptSkipTargetFilled.setText(_translate("SettingsWindow", "Skip if target filled"))
+        self.promptSkipTargetFilled.setToolTip(_translate("SettingsWindow", "Leave out notes whose target field (all mapped fields for JSON) already has content."))
+        self.promptSkipSourceEmpty.setText(_translate("SettingsWindow", "Skip if source empty"))
+        self.promptSkipSourceEmpty.setToolTip(_translate("SettingsWindow", "Leave out notes where a field used in the prompt is empty."))
+        self.labelPromptSkipTags.setText(_translate("SettingsWindow", "Skip tags:"))
+        self.promptSkipTags.setPlaceholderText(_translate("SettingsWindow", "space-separated tags"))
+        self.promptNormalizeCheckbox.setText(_translate("SettingsWindow", "Clean field content"))
+        self.promptNormalizeCheckbox.setToolTip(_translate("SettingsWindow", "Strip HTML, [sound:...] references and cloze markup and collapse whitespace in fields before they are inserted into the prompt."))
         self.promptTargetField.setPlaceholderText(_translate("SettingsWindow", "Target Field"))
         self.labelPromptMapping.setText(_translate("SettingsWindow", "JSON Mapping (Key: Field Name):"))
         self.labelPromptText.setText(_translate("SettingsWindow", "Prompt Template:"))
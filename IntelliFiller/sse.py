@@ -0,0 +1,33 @@
+import json
+
+
+def iter_sse_data(response):
+    """
+    Yields the decoded JSON payload of each server-sent event from an httpx streaming response.
+    Comment lines and the OpenAI-style "[DONE]" sentinel are skipped.
+    """
+    data_lines = []
+    for line in response.iter_lines():
+        if line.startswith(":"):
+            continue
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+            continue
+        if not line.strip() and data_lines:
+            # Blank line terminates the event
+            payload = "\n".join(data_lines)
+            data_lines = []
+            if payload != "[DONE]":
+                yield json.loads(payload)
+
+    if data_lines:
+        payload = "\n".join(data_lines)
+        if payload != "[DONE]":
+            yield json.loads(payload)
+
+
+def raise_for_stream_status(response):
+    # Streaming responses have no body loaded yet; read it so the error message can include it
+    if response.is_error:
+        response.read()
+        response.raise_for_status()
@@ -0,0 +1,192 @@
+import math
+import re
+import threading
+
+from .provider_errors import ProviderError
+
+# Kana, CJK ideographs and Hangul: roughly one token per character or more
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+# An unfinished HTML tag or entity at the end of a cut (raw field values aren't normalized)
+OPEN_MARKUP_PATTERN = re.compile(r'<[a-zA-Z/!][^<>]*$|&#?\w{0,31}$')
+
+# Tokenizer family -> (ASCII characters per token, tokens per CJK character, tokens per other non-ASCII character)
+FAMILIES = {
+    'openai': (4.0, 1.0, 0.5),
+    'anthropic': (3.5, 1.3, 0.7),
+    'gemini': (4.0, 0.8, 0.4),
+    # Unknown tokenizer: err on the large side
+    'generic': (3.5, 1.3, 0.7),
+}
+
+# Model name prefix -> (family, context window in tokens); more specific prefixes first
+MODEL_LIMITS = [
+    ('gpt-4.1', 'openai', 1047576),
+    ('gpt-4o', 'openai', 128000),
+    ('gpt-4-turbo', 'openai', 128000),
+    ('gpt-4', 'openai', 8192),
+    ('gpt-3.5', 'openai', 16385),
+    ('gpt-5', 'openai', 400000),
+    ('o1', 'openai', 200000),
+    ('o3', 'openai', 200000),
+    ('o4', 'openai', 200000),
+    ('claude', 'anthropic', 200000),
+    ('gemini', 'gemini', 1048576),
+]
+
+PROVIDER_FAMILIES = {
+    'openai': 'openai',
+    'anthropic': 'anthropic',
+    'gemini': 'gemini',
+}
+
+
+class PromptTooLarge(ValueError):
+    """A rendered prompt exceeds its prompt's input budget (skip policy, or truncation couldn't make it fit)."""
+
+
+class TokenEstimator:
+    """
+    Offline token count for one tokenizer family: plain ASCII is counted by length,
+    CJK and other non-ASCII characters at their own rates. Costs one pass in C per prompt.
+    """
+    def __init__(self, family, context_window=None):
+        self.family = family
+        self.chars_per_token, self.cjk_rate, self.other_rate = FAMILIES[family]
+        self.context_window = context_window
+
+    def estimate(self, text):
+        if text.isascii():
+            return max(1, math.ceil(len(text) / self.chars_per_token))
+        ascii_chars = len(text.encode('ascii', 'ignore'))
+        non_ascii = len(text) - ascii_chars
+        cjk = len(CJK_PATTERN.findall(text))
+        tokens = ascii_chars / self.chars_per_token + cjk * self.cjk_rate + (non_ascii - cjk) * self.other_rate
+        return max(1, math.ceil(tokens))
+
+    def check(self, prompt, model):
+        """Rejects a prompt the model can't accept before anything is sent. Returns the estimate."""
+        tokens = self.estimate(prompt)
+        if self.context_window is not None and tokens > self.context_window:
+            # Not retryable: the same prompt fails the same way every time
+            raise ProviderError(
+                f"Prompt too large: ~{tokens} tokens, {model} accepts about {self.context_window}. "
+                f"Set an inputBudget on the prompt to truncate or skip such notes.",
+                retryable=False
+            )
+        return tokens
+
+
+_estimators = {}
+_estimators_lock = threading.Lock()
+
+
+def lookup_model(model):
+    # OpenRouter style "vendor/model" names
+    name = model.lower().rsplit('/', 1)[-1]
+    for prefix, family, window in MODEL_LIMITS:
+        if name.startswith(prefix):
+            return family, window
+    return None, None
+
+
+def get_estimator(config):
+    """Returns the shared TokenEstimator for the selected provider and model."""
+    from .data_request import resolve_model
+
+    provider = config.get('selectedApi', 'openai')
+    model = resolve_model(config, provider)
+    limits = config.get('inputLimit', {})
+    window_override = int(limits.get('contextWindow', 0) or 0)
+    output_reserve = int(limits.get('outputReserve', 1024) or 0)
+    key = (provider, model, window_override, output_reserve)
+
+    with _estimators_lock:
+        estimator = _estimators.get(key)
+        if estimator is None:
+            family, window = lookup_model(model)
+            family = family or PROVIDER_FAMILIES.get(provider, 'generic')
+            window = window_override or window
+            if window:
+                # Leave room for the answer
+                window = max(1, window - output_reserve)
+            estimator = _estimators[key] = TokenEstimator(family, window or None)
+    return estimator
+
+
+def cut_text(text, end):
+    """text[:end], backed off to before a tag or entity the cut would split, so no half of it leaks into the prompt."""
+    head = text[:end]
+    match = OPEN_MARKUP_PATTERN.search(head)
+    return head[:match.start()] if match else head
+
+
+class InputBudget:
+    """
+    Per-prompt input budget for one job. Over-budget prompts are skipped (PromptTooLarge) or have
+    the field values that take up most of the rendered prompt shortened until it fits; a prompt that
+    would only fit with a field cut to nothing is skipped too. Counts what it did for the size report.
+    """
+    TRUNCATION_MARK = "…"
+
+    def __init__(self, max_tokens, policy, estimator):
+        self.max_tokens = max_tokens
+        self.policy = policy
+        self.estimator = estimator
+        self.lock = threading.Lock()
+        self.truncated = 0
+        self.skipped = 0
+
+    def count(self, attribute):
+        with self.lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def apply(self, prompt, values, render):
+        """
+        Fits a rendered prompt into the budget. values are the prompt's field values in slot order
+        and render(values) rebuilds the prompt from (shortened) values.
+        """
+        tokens = self.estimator.estimate(prompt)
+        if tokens <= self.max_tokens:
+            return prompt
+        if self.policy == "truncate" and values:
+            values = list(values)
+            mark_tokens = self.estimator.estimate(self.TRUNCATION_MARK)
+            for _ in range(2 * len(values) + 4):
+                # Each field's share of the rendered prompt, not its raw length: markup may render to little or nothing
+                shares = [tokens - self.estimator.estimate(render(values[:j] + [""] + values[j + 1:])) if values[j] else 0
+                          for j in range(len(values))]
+                i = max(range(len(values)), key=lambda j: shares[j])
+                if shares[i] <= 0:
+                    break
+                value = values[i]
+                excess = tokens - self.max_tokens + mark_tokens
+                # A field that can't absorb the whole excess gives up half its share; later passes cut the others
+                cut_tokens = excess if excess < shares[i] else shares[i] / 2
+                head = cut_text(value, len(value) - math.ceil(cut_tokens * len(value) / shares[i]))
+                if not head.strip():
+                    break
+                values[i] = head + self.TRUNCATION_MARK
+                prompt = render(values)
+                tokens = self.estimator.estimate(prompt)
+                if tokens <= self.max_tokens:
+                    self.count("truncated")
+                    return prompt
+        self.count("skipped")
+        raise PromptTooLarge(f"Prompt too large: ~{tokens} tokens, input budget is {self.max_tokens}.")
+
+
+def get_input_budget(prompt_config, estimator):
+    """
+    Returns the prompt's InputBudget, or None if it has none.
+    A maxTokens of 0 means "whatever the model accepts".
+    """
+    budget = prompt_config.get("inputBudget") or {}
+    policy = budget.get("policy", "")
+    if policy not in ("truncate", "skip"):
+        return None
+    max_tokens = int(budget.get("maxTokens", 0) or 0)
+    if estimator.context_window is not None:
+        max_tokens = min(max_tokens, estimator.context_window) if max_tokens > 0 else estimator.context_window
+    if max_tokens <= 0:
+        return None
+    return InputBudget(max_tokens, policy, estimator)
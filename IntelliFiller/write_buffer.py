@@ -0,0 +1,52 @@
+def merge_changes(pending, changes):
+    """Merges {field: (old, new)} changes; the first known old value wins, the last new value."""
+    for name, (old, value) in changes.items():
+        if name in pending and pending[name][0] is not None:
+            old = pending[name][0]
+        pending[name] = (old, value)
+
+
+class NoteWriteBuffer:
+    """
+    Write-behind buffer for modified notes.
+    Changed fields are collected per note (deduplicated by id) and handed to the main-thread
+    CollectionWriter in chunks, which saves each chunk with one col.update_notes call,
+    i.e. one transaction and one undo entry per chunk instead of one write per note or field.
+    """
+    def __init__(self, chunk_size=50, on_written=None):
+        self.chunk_size = max(1, int(chunk_size))
+        self.pending = {} # note id -> {field: (value when fetched or None, new value)}, in insertion order
+        # Called (on the main thread) with the ids of every chunk that reached the collection
+        self.on_written = on_written
+
+    def add(self, note, original_fields=None):
+        """
+        Queues the note's changed fields (all fields if the originals aren't known). Each carries the
+        value it replaces, so the writer can leave alone fields edited in the meantime.
+        """
+        # Notes without an id (AddCards) aren't in the collection yet
+        if not note.id:
+            return
+        if original_fields is None:
+            changes = {name: (None, value) for name, value in note.items()}
+        else:
+            changes = {name: (old, value) for (name, value), old in zip(note.items(), original_fields) if value != old}
+        if changes:
+            merge_changes(self.pending.setdefault(note.id, {}), changes)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Hands all pending notes to the collection writer. Returns the number of notes queued."""
+        # Late import: the writer pulls in aqt
+        from .collection_writer import CollectionWriter
+
+        if not self.pending:
+            return 0
+        updates = list(self.pending.items())
+        self.pending = {}
+        CollectionWriter.instance().post(updates, self.on_written, self.chunk_size)
+        return len(updates)
+
+    def __len__(self):
+        return len(self.pending)